@@ -9,43 +9,101 @@ class EnvironmentError(Exception):
         super().__init__(f'Environment variable {env_var_name} is not set')
 
 
-def getenv(env_var_name: str) -> str:
-    env = os.getenv(env_var_name)
+_missing_env_vars: set[str] = set()
+
+
+def getenv(env_var_name: str, default: str | None = None) -> str:
+    env = os.getenv(env_var_name, default)
     if env is None:
         raise EnvironmentError(env_var_name)
     return env
 
 
+def getenv_deferred(env_var_name: str, fallback: str = '') -> str:
+    """
+    Reads a variable only some entry points need. A missing one does not fail the import,
+    the entry point using it asks for it with require_env.
+    """
+    env = os.getenv(env_var_name)
+    if env is None:
+        _missing_env_vars.add(env_var_name)
+        return fallback
+    return env
+
+
+def require_env(*env_var_names: str):
+    for env_var_name in env_var_names:
+        if env_var_name in _missing_env_vars:
+            raise EnvironmentError(env_var_name)
+
+
 # Telegram API Setting
-TELEGRAM_BOT_TOKEN = getenv('TELEGRAM_BOT_TOKEN')
-TELEGRAM_BOT_ALLOWED_USERS = getenv('TELEGRAM_BOT_ALLOWED_USERS').split(',')
+TELEGRAM_BOT_TOKEN = getenv_deferred('TELEGRAM_BOT_TOKEN')
+TELEGRAM_BOT_ALLOWED_USERS = [user for user in getenv_deferred('TELEGRAM_BOT_ALLOWED_USERS').split(',') if user]
+TELEGRAM_VOICE_IN_MEMORY = getenv('TELEGRAM_VOICE_IN_MEMORY', 'true').lower() == 'true'
+TELEGRAM_VOICE_MEMORY_LIMIT_KB = int(getenv('TELEGRAM_VOICE_MEMORY_LIMIT_KB', '2048'))
 
 # LLM Settings
 LLM_MODEL = getenv('LLM_MODEL')
+LLM_SYSTEM_PROMPT = getenv('LLM_SYSTEM_PROMPT', '')
+LLM_CONTEXT_TOKEN_BUDGET = int(getenv('LLM_CONTEXT_TOKEN_BUDGET', '2048'))
+LLM_MEMORY_SUMMARIZE = getenv('LLM_MEMORY_SUMMARIZE', 'false').lower() == 'true'
 
 # STT Settings
+STT_ENGINE = getenv('STT_ENGINE', 'whisper')
 STT_WHISPER_MODEL = getenv('STT_WHISPER_MODEL')
+STT_COMPUTE_TYPE = getenv('STT_COMPUTE_TYPE', 'int8')
+STT_CPU_THREADS = int(getenv('STT_CPU_THREADS', '0'))
 
 # TTS Settings
 TTS_XTTS_MODEL = getenv('TTS_XTTS_MODEL')
 TTS_XTTS_SPEAKER = getenv('TTS_XTTS_SPEAKER')
 TTS_XTTS_LANGUAGE = getenv('TTS_XTTS_LANGUAGE')
+TTS_CACHE_MEMORY_ITEMS = int(getenv('TTS_CACHE_MEMORY_ITEMS', '128'))
+TTS_CACHE_DISK_LIMIT_MB = int(getenv('TTS_CACHE_DISK_LIMIT_MB', '256'))
+
+# Inference Settings
+INFERENCE_MAX_BATCH_SIZE = int(getenv('INFERENCE_MAX_BATCH_SIZE', '8'))
+INFERENCE_MAX_BATCH_DELAY = float(getenv('INFERENCE_MAX_BATCH_DELAY_MS', '10')) / 1000
+INFERENCE_MAX_QUEUE_SIZE = int(getenv('INFERENCE_MAX_QUEUE_SIZE', '64'))
+
+# Admission Settings
+ADMISSION_MAX_CONCURRENT_PER_USER = int(getenv('ADMISSION_MAX_CONCURRENT_PER_USER', '1'))
+ADMISSION_MAX_QUEUE_PER_USER = int(getenv('ADMISSION_MAX_QUEUE_PER_USER', '2'))
+ADMISSION_MAX_QUEUE_SIZE = int(getenv('ADMISSION_MAX_QUEUE_SIZE', '32'))
+ADMISSION_OVERFLOW_POLICY = getenv('ADMISSION_OVERFLOW_POLICY', 'reject')
+ADMISSION_MAX_WAIT = float(getenv('ADMISSION_MAX_WAIT_S', '20'))
+
+# Tracing Settings
+METRICS_HOST = getenv('METRICS_HOST', '0.0.0.0')
+TELEGRAM_BOT_METRICS_PORT = int(getenv('TELEGRAM_BOT_METRICS_PORT', '9101'))
+WS_METRICS_PORT = int(getenv('WS_METRICS_PORT', '9102'))
+TRACE_LOG_SPANS = getenv('TRACE_LOG_SPANS', 'false').lower() == 'true'
 
 # File System Settings
 config_script_path = os.path.abspath(__file__)
 project_root_dir = os.path.dirname(config_script_path)
-os.path.join(project_root_dir, getenv('FS_ROOT_PATH'))
 FS_ROOT_PATH = os.path.join(project_root_dir, getenv('FS_ROOT_PATH'))
+READINESS_PHRASES_PATH = os.path.join(project_root_dir, getenv('READINESS_PHRASES_PATH', 'sentences'))
+ARTIFACTS_MEMORY_LIMIT_MB = int(getenv('ARTIFACTS_MEMORY_LIMIT_MB', '64'))
+ARTIFACTS_DISK_LIMIT_MB = int(getenv('ARTIFACTS_DISK_LIMIT_MB', '512'))
+ARTIFACTS_MAX_AGE = float(getenv('ARTIFACTS_MAX_AGE_S', '3600'))
+ARTIFACTS_SWEEP_INTERVAL = float(getenv('ARTIFACTS_SWEEP_INTERVAL_S', '60'))
 
 # Audio Capture Settings
-AUDIO_CAPTURE_SAMPLE_RATE = float(getenv('AUDIO_CAPTURE_SAMPLE_RATE'))
-AUDIO_CAPTURE_CHUNK_SIZE = getenv('AUDIO_CAPTURE_CHUNK_SIZE')
-AUDIO_CAPTURE_CHANNELS = getenv('AUDIO_CAPTURE_CHANNELS')
+AUDIO_CAPTURE_CHUNK_SIZE = getenv_deferred('AUDIO_CAPTURE_CHUNK_SIZE')
+AUDIO_CAPTURE_CHANNELS = getenv_deferred('AUDIO_CAPTURE_CHANNELS')
 AUDIO_CAPTURE_SILENCE_THRESHOLD = float(getenv('AUDIO_CAPTURE_SILENCE_THRESHOLD'))
 AUDIO_CAPTURE_SILENCE_DURATION = float(getenv('AUDIO_CAPTURE_SILENCE_DURATION'))
-AUDIO_CAPTURE_FILENAME = getenv('AUDIO_CAPTURE_FILENAME')
-AUDIO_CAPTURE_KEY_WORD = getenv('AUDIO_CAPTURE_KEY_WORD')
+AUDIO_CAPTURE_FILENAME = getenv_deferred('AUDIO_CAPTURE_FILENAME')
+AUDIO_CAPTURE_KEY_WORD = getenv_deferred('AUDIO_CAPTURE_KEY_WORD')
+
+# Keyword Spotting Settings
+KWS_ENGINE = getenv('KWS_ENGINE', 'whisper_tiny')
+KWS_WHISPER_MODEL = getenv('KWS_WHISPER_MODEL', 'tiny')
+KWS_WINDOW_OVERLAP = float(getenv('KWS_WINDOW_OVERLAP', '1.0'))
 
 # WebSockets Settings
-WS_HOST = getenv('WS_HOST')
-WS_PORT = int(getenv('WS_PORT'))
+WS_HOST = getenv_deferred('WS_HOST')
+WS_PORT = int(getenv_deferred('WS_PORT', '0'))
+WS_AUDIO_MAX_LAG = float(getenv('WS_AUDIO_MAX_LAG_S', '4'))
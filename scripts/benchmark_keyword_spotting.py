@@ -0,0 +1,76 @@
+import argparse
+import glob
+import os
+import time
+
+import numpy as np
+
+from src.audio_formatter.services import PCM_FORMAT, PCM_SAMPLE_RATE, PydubService
+from src.inference.services import InferenceScheduler
+from src.keyword_spotting.services import OverlappingWindows, TranscriptKeywordSpotter, WhisperKeywordSpotter
+from src.speech2text.services import make_speech_to_text
+
+WINDOW_DURATION = 2
+FIXTURE_EXTENSIONS = ('.wav', '.ogg', '.webm')
+
+
+def load_fixture_windows(fixtures_path: str, window_duration: float = WINDOW_DURATION):
+    formatter = PydubService()
+    window_samples = int(window_duration * PCM_SAMPLE_RATE)
+    fixtures = []
+    for file_path in sorted(glob.glob(os.path.join(fixtures_path, '*'))):
+        if not file_path.endswith(FIXTURE_EXTENSIONS):
+            continue
+        audio = formatter.read_audio_from_file(file_path)
+        pcm = formatter.write_audio_into_buffer(audio, PCM_FORMAT)
+        windows = [pcm[start : start + window_samples] for start in range(0, len(pcm), window_samples)]
+        fixtures.append((os.path.basename(file_path), windows))
+    return fixtures
+
+
+def run_engine(engine_name: str, keyword_spotter, fixtures):
+    latencies = []
+    detections = []
+    for fixture_name, windows in fixtures:
+        key_word_windows = OverlappingWindows()
+        for window in windows:
+            started_at = time.perf_counter()
+            if keyword_spotter.detect(key_word_windows.push(window)):
+                detections.append(fixture_name)
+            latencies.append(time.perf_counter() - started_at)
+
+    stats = keyword_spotter.get_stats()
+    print(
+        f'{engine_name}: windows={len(latencies)} detections={len(detections)} '
+        f'latency p50={np.percentile(latencies, 50):.3f}s p95={np.percentile(latencies, 95):.3f}s '
+        f'rtf={stats["real_time_factor"]:.3f} cpu_per_audio_second={stats["cpu_per_audio_second"]:.3f}'
+    )
+    for fixture_name in sorted(set(detections)):
+        print(f'  detected in {fixture_name}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Latency and CPU cost of the keyword spotting engines')
+    parser.add_argument('--fixtures', default='sentences', help='directory with wav/ogg/webm recordings')
+    parser.add_argument('--engines', default='whisper_tiny,transcript', help='comma separated engine names')
+    args = parser.parse_args()
+
+    fixtures = load_fixture_windows(args.fixtures)
+    if not fixtures:
+        print(f'No audio fixtures found in {args.fixtures}')
+        return
+
+    for engine_name in args.engines.split(','):
+        if engine_name == 'whisper_tiny':
+            keyword_spotter = WhisperKeywordSpotter()
+        elif engine_name == 'transcript':
+            speech_to_text = make_speech_to_text()
+            keyword_spotter = TranscriptKeywordSpotter(InferenceScheduler('stt', speech_to_text.analyze_batch))
+        else:
+            print(f'Unknown engine {engine_name}')
+            continue
+        run_engine(engine_name, keyword_spotter, fixtures)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,242 @@
+import argparse
+import asyncio
+import glob
+import json
+import os
+from types import SimpleNamespace
+
+import numpy as np
+
+from config import AUDIO_CAPTURE_SILENCE_DURATION, READINESS_PHRASES_PATH, TELEGRAM_BOT_ALLOWED_USERS
+from src.audio_formatter.services import PCM_FORMAT, PCM_SAMPLE_RATE, PydubService
+from src.benchmark.fakes import FakeKeywordSpotter, FakeLangChainService, FakeWhisperService, FakeXTTSService
+from src.benchmark.services import LatencyRecorder, compare_with_baseline, load_baseline, save_baseline
+
+FIXTURE_EXTENSIONS = ('.wav', '.ogg', '.webm')
+BENCHMARK_USER_ID = 'benchmark'
+SCENARIOS = ('telegram', 'websocket')
+
+
+def load_fixtures(fixtures_path: str) -> list[dict]:
+    """
+    Prepares every recording the way each bot handles it: an OGG/Opus voice note for Telegram and,
+    for the websocket session, a PCM window as produced by its streaming decoder followed by a window
+    of trailing silence.
+    """
+    formatter = PydubService()
+    silence_pcm = np.zeros(int((AUDIO_CAPTURE_SILENCE_DURATION + 0.5) * PCM_SAMPLE_RATE), dtype=np.float32)
+    fixtures = []
+    for file_path in sorted(glob.glob(os.path.join(fixtures_path, '*'))):
+        if not file_path.endswith(FIXTURE_EXTENSIONS):
+            continue
+        audio = formatter.read_audio_from_file(file_path)
+        fixtures.append({
+            'name': os.path.basename(file_path),
+            'ogg': formatter.write_buffer(audio, 'ogg'),
+            'pcm': formatter.write_audio_into_buffer(audio, PCM_FORMAT),
+            'silence_pcm': silence_pcm,
+        })
+    return fixtures
+
+
+def make_factories(args, recorder: LatencyRecorder) -> dict:
+    def make_speech_to_text():
+        speech_to_text = FakeWhisperService(delay=args.stt_delay, real_time_factor=args.stt_rtf)
+        recorder.wrap(speech_to_text, 'analyze_batch', 'stt')
+        return speech_to_text
+
+    def make_text_to_speech():
+        text_to_speech = FakeXTTSService(first_chunk_delay=args.tts_first_chunk_delay, real_time_factor=args.tts_rtf)
+        recorder.wrap(text_to_speech, 'synthesize', 'tts')
+        recorder.wrap_first_item(text_to_speech, 'stream', 'tts_first_chunk')
+        return text_to_speech
+
+    def make_langchain():
+        langchain = FakeLangChainService(
+            first_sentence_delay=args.llm_first_delay, sentence_delay=args.llm_sentence_delay
+        )
+        recorder.wrap_first_async_item(langchain, 'aask_model', 'llm_first_sentence')
+        return langchain
+
+    return {
+        'stt': make_speech_to_text,
+        'tts': make_text_to_speech,
+        'llm': make_langchain,
+        'kws': FakeKeywordSpotter,
+    }
+
+
+def wrap_formatter(formatter, recorder: LatencyRecorder):
+    processing_buffer = formatter.processing_buffer
+
+    def timed_processing_buffer(input_audio, input_format: str, output_format: str, *args, **kwargs):
+        stage = 'decode' if output_format == PCM_FORMAT else 'encode'
+        with recorder.measure(stage):
+            return processing_buffer(input_audio, input_format, output_format, *args, **kwargs)
+
+    formatter.processing_buffer = timed_processing_buffer
+
+
+async def run_telegram(args, fixtures: list[dict], recorder: LatencyRecorder):
+    from scripts import telegram_bot
+
+    for name, factory in make_factories(args, recorder).items():
+        telegram_bot.registry.register(name, factory)
+    telegram_bot.registry.load_all()
+    TELEGRAM_BOT_ALLOWED_USERS.append(BENCHMARK_USER_ID)
+    # All requests come from one benchmark user, so its concurrency limit follows --concurrency
+    telegram_bot.admission.max_concurrent_per_user = args.concurrency
+
+    wrap_formatter(telegram_bot.formatter, recorder)
+    recorder.wrap(telegram_bot, 'decode_voice_file', 'decode')
+    recorder.wrap(telegram_bot.voice_activity, 'is_speech', 'vad')
+
+    async def send_voice(chat_id, voice: bytes):
+        with recorder.measure('send'):
+            await asyncio.sleep(args.send_delay)
+        recorder.mark_audio_sent()
+
+    async def download_to_drive(file_path: str, data: bytes):
+        with open(file_path, 'wb') as file:
+            file.write(data)
+
+    async def download_as_bytearray(data: bytes):
+        return bytearray(data)
+
+    async def reply_text(text: str):
+        print(f'Telegram bot replied with text: {text}')
+
+    context = SimpleNamespace(bot=SimpleNamespace(send_voice=send_voice))
+
+    async def handle(fixture: dict, index: int):
+        data = fixture['ogg']
+        telegram_file = SimpleNamespace(
+            download_to_drive=lambda file_path: download_to_drive(file_path, data),
+            download_as_bytearray=lambda: download_as_bytearray(data),
+        )
+
+        async def get_file():
+            return telegram_file
+
+        update = SimpleNamespace(
+            effective_user=SimpleNamespace(id=BENCHMARK_USER_ID),
+            message=SimpleNamespace(
+                chat_id=index,
+                voice=SimpleNamespace(file_unique_id=f'benchmark_{index}', file_size=len(data), get_file=get_file),
+                reply_text=reply_text,
+            ),
+        )
+        recorder.start_request()
+        try:
+            await telegram_bot.handle_audio(update, context)  # type: ignore
+        finally:
+            recorder.finish_request()
+
+    await run_requests(args, fixtures, handle)
+
+
+class FakeWebSocket:
+    def __init__(self, send_delay: float, recorder: LatencyRecorder) -> None:
+        self.send_delay = send_delay
+        self.recorder = recorder
+
+    async def send(self, message):
+        with self.recorder.measure('send'):
+            await asyncio.sleep(self.send_delay)
+        self.recorder.mark_audio_sent()
+
+
+async def run_websocket(args, fixtures: list[dict], recorder: LatencyRecorder):
+    from scripts.websocket_bot import WebSocketsBot, WebSocketsSession
+
+    bot = WebSocketsBot(factories=make_factories(args, recorder))
+    wrap_formatter(bot.formatter, recorder)
+    recorder.wrap(bot.voice_activity, 'is_speech', 'vad')
+
+    async def handle(fixture: dict, index: int):
+        session = WebSocketsSession(bot, FakeWebSocket(args.send_delay, recorder))
+        session.handle_text_message(json.dumps({'type': 'hello', 'framing': args.framing, 'codec': args.codec}))
+        recorder.wrap(session, 'encode_voice_chunk', 'encode')
+        # The key word was already spotted, the fixture is the question itself
+        session.capture_voice_query = True
+        await session.handle_voice(fixture['pcm'])
+        # The clock starts with the window that ends the utterance, the earliest moment an answer can start
+        recorder.start_request()
+        try:
+            await session.handle_voice(fixture['silence_pcm'])
+            if session.answer_task:
+                await session.answer_task
+        finally:
+            recorder.finish_request()
+            await session.close()
+            bot.langchain.forget(session.session_id)
+
+    await run_requests(args, fixtures, handle)
+
+
+async def run_requests(args, fixtures: list[dict], handle):
+    requests = [fixture for _ in range(args.repeats) for fixture in fixtures]
+    for start in range(0, len(requests), args.concurrency):
+        batch = requests[start : start + args.concurrency]
+        await asyncio.gather(*(handle(fixture, start + offset) for offset, fixture in enumerate(batch)))
+
+
+def print_summary(scenario: str, summary: dict):
+    ttfa = summary['time_to_first_audio']
+    print(f'{scenario}: requests={summary["requests"]} unanswered={summary["unanswered"]}')
+    if ttfa['calls']:
+        print(f'  time to first audio p50={ttfa["p50"]:.3f}s p90={ttfa["p90"]:.3f}s p99={ttfa["p99"]:.3f}s')
+    for stage, stage_summary in sorted(summary['stages'].items()):
+        print(
+            f'  {stage:<16} calls={stage_summary["calls"]:<4} '
+            f'p50={stage_summary["p50"]:.3f}s p95={stage_summary["p95"]:.3f}s'
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='End-to-end latency of both bots with deterministic stand-in models, runs offline'
+    )
+    parser.add_argument('--fixtures', default=READINESS_PHRASES_PATH, help='directory with wav/ogg/webm recordings')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='comma separated: telegram,websocket')
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--concurrency', type=int, default=1, help='requests handled at the same time')
+    parser.add_argument('--framing', default='binary', choices=('json', 'binary'))
+    parser.add_argument('--codec', default='pcm16', choices=('pcm16', 'ogg'))
+    parser.add_argument('--stt-delay', type=float, default=0.2)
+    parser.add_argument('--stt-rtf', type=float, default=0.1)
+    parser.add_argument('--llm-first-delay', type=float, default=0.4)
+    parser.add_argument('--llm-sentence-delay', type=float, default=0.3)
+    parser.add_argument('--tts-first-chunk-delay', type=float, default=0.3)
+    parser.add_argument('--tts-rtf', type=float, default=0.5)
+    parser.add_argument('--send-delay', type=float, default=0.02)
+    parser.add_argument('--baseline', help='JSON results of an earlier run to compare with')
+    parser.add_argument('--save-baseline', help='where to store the JSON results of this run')
+    parser.add_argument('--max-regression', type=float, default=0.1, help='allowed slowdown against the baseline')
+    args = parser.parse_args()
+
+    fixtures = load_fixtures(args.fixtures)
+    if not fixtures:
+        print(f'No audio fixtures found in {args.fixtures}')
+        return
+
+    runners = {'telegram': run_telegram, 'websocket': run_websocket}
+    results = {}
+    for scenario in args.scenarios.split(','):
+        recorder = LatencyRecorder()
+        asyncio.run(runners[scenario](args, fixtures, recorder))
+        results[scenario] = recorder.summarize()
+        print_summary(scenario, results[scenario])
+
+    if args.save_baseline:
+        save_baseline(args.save_baseline, results)
+        print(f'Saved results to {args.save_baseline}')
+    if args.baseline:
+        regressions = compare_with_baseline(results, load_baseline(args.baseline), args.max_regression)
+        if regressions:
+            print(f'Regressions over {args.max_regression:.0%}: {", ".join(regressions)}')
+            raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
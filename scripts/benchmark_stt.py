@@ -0,0 +1,97 @@
+import argparse
+import glob
+import os
+import time
+
+import numpy as np
+
+from config import STT_WHISPER_MODEL
+from src.audio_formatter.services import PCM_FORMAT, PCM_SAMPLE_RATE, PydubService
+from src.benchmark.services import word_error_rate
+from src.speech2text.services import make_speech_to_text
+
+FIXTURE_EXTENSIONS = ('.wav', '.ogg', '.webm')
+
+
+def load_fixtures(fixtures_path: str):
+    """
+    Decodes every recording to 16 kHz PCM once. A .txt file next to a recording holds its reference transcript.
+    """
+    formatter = PydubService()
+    fixtures = []
+    for file_path in sorted(glob.glob(os.path.join(fixtures_path, '*'))):
+        if not file_path.endswith(FIXTURE_EXTENSIONS):
+            continue
+        audio = formatter.read_audio_from_file(file_path)
+        pcm = formatter.write_audio_into_buffer(audio, PCM_FORMAT)
+        reference_path = os.path.splitext(file_path)[0] + '.txt'
+        reference = None
+        if os.path.exists(reference_path):
+            with open(reference_path, 'r', encoding='utf-8') as file:
+                reference = file.read().strip()
+        fixtures.append((os.path.basename(file_path), pcm, reference))
+    return fixtures
+
+
+def run_engine(engine_name: str, fixtures, language: str | None):
+    started_at = time.perf_counter()
+    speech_to_text = make_speech_to_text(engine_name)
+    load_time = time.perf_counter() - started_at
+    speech_to_text.warm_up()
+
+    transcripts = {}
+    wall_seconds = 0.0
+    cpu_seconds = 0.0
+    for fixture_name, pcm, _ in fixtures:
+        started_at = time.perf_counter()
+        started_cpu_at = time.process_time()
+        # use_model bypasses the analysis cache, every engine decodes every fixture
+        transcripts[fixture_name] = speech_to_text.use_model(pcm, language=language)['text'].strip()
+        wall_seconds += time.perf_counter() - started_at
+        cpu_seconds += time.process_time() - started_cpu_at
+
+    audio_seconds = sum(len(pcm) for _, pcm, _ in fixtures) / PCM_SAMPLE_RATE
+    stats = {
+        'load_time': load_time,
+        'real_time_factor': wall_seconds / audio_seconds,
+        'cpu_per_audio_second': cpu_seconds / audio_seconds,
+    }
+    return transcripts, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Real-time factor and word error rate of the speech to text engines')
+    parser.add_argument(
+        '--fixtures', default='sentences', help='directory with wav/ogg/webm recordings and optional .txt references'
+    )
+    parser.add_argument('--engines', default='whisper,faster_whisper', help='comma separated engine names')
+    parser.add_argument('--language', default=None, help='language of the recordings, detected when omitted')
+    args = parser.parse_args()
+
+    fixtures = load_fixtures(args.fixtures)
+    if not fixtures:
+        print(f'No audio fixtures found in {args.fixtures}')
+        return
+
+    engine_names = args.engines.split(',')
+    results = {engine_name: run_engine(engine_name, fixtures, args.language) for engine_name in engine_names}
+
+    # Without a reference transcript the first engine's output is the reference, so WER shows disagreement with it
+    reference_engine = engine_names[0]
+    print(f'model={STT_WHISPER_MODEL} fixtures={len(fixtures)}')
+    for engine_name, (transcripts, stats) in results.items():
+        error_rates = []
+        for fixture_name, _, reference in fixtures:
+            if reference is None:
+                reference = results[reference_engine][0][fixture_name]
+            error_rates.append(word_error_rate(reference, transcripts[fixture_name]))
+        print(
+            f'{engine_name}: load={stats["load_time"]:.1f}s rtf={stats["real_time_factor"]:.3f} '
+            f'cpu_per_audio_second={stats["cpu_per_audio_second"]:.3f} wer={np.mean(error_rates):.3f}'
+        )
+        for fixture_name, _, _ in fixtures:
+            print(f'  {fixture_name}: {transcripts[fixture_name]}')
+
+
+if __name__ == '__main__':
+    main()
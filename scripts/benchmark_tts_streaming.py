@@ -0,0 +1,60 @@
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from src.text2speech.cache import SynthesisCache
+from src.text2speech.services import XTTSService
+
+SENTENCES = [
+    'Привет!',
+    'Сегодня в Москве облачно, днём около пятнадцати градусов, вечером возможен небольшой дождь.',
+    'Чтобы приготовить омлет, взбейте три яйца с молоком, посолите и жарьте на среднем огне пять минут.',
+]
+
+
+def measure_file_mode(text_to_speech: XTTSService, text: str, output_path: str):
+    started_at = time.perf_counter()
+    text_to_speech.processing(output_path, text)
+    elapsed = time.perf_counter() - started_at
+    # A file can only be sent once it is fully rendered
+    return elapsed, elapsed
+
+
+def measure_stream_mode(text_to_speech: XTTSService, text: str):
+    started_at = time.perf_counter()
+    time_to_first_chunk = None
+    for _ in text_to_speech.stream(text):
+        if time_to_first_chunk is None:
+            time_to_first_chunk = time.perf_counter() - started_at
+    return time_to_first_chunk, time.perf_counter() - started_at
+
+
+def main():
+    parser = argparse.ArgumentParser(description='XTTS time to first audio chunk: file mode against streaming')
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temporary_dir:
+        cache = SynthesisCache(cache_path=temporary_dir, memory_items=0, disk_size_limit=0)
+        text_to_speech = XTTSService(cache=cache)
+        output_path = os.path.join(temporary_dir, 'sentence.wav')
+        # Warm-up run, so model initialization is not measured
+        text_to_speech.synthesize(SENTENCES[0])
+
+        for text in SENTENCES:
+            for mode in ('file', 'stream'):
+                results = []
+                for _ in range(args.repeats):
+                    if mode == 'file':
+                        results.append(measure_file_mode(text_to_speech, text, output_path))
+                    else:
+                        results.append(measure_stream_mode(text_to_speech, text))
+                first_audio = statistics.median(result[0] for result in results)
+                total = statistics.median(result[1] for result in results)
+                print(f'{mode:>6} {len(text):>4} chars: first_audio={first_audio:.2f}s total={total:.2f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+import argparse
+import asyncio
+import base64
+import json
+import os
+import statistics
+import time
+
+import websockets
+
+from src.audio_formatter.services import PCM_FORMAT, PydubService
+from src.websocket_api.services import BinaryFrameEncoder, decode_frame, make_json_frame, pcm_to_pcm16
+
+SAMPLE_RATE = 24000
+MODES = ('json', 'binary-pcm16', 'binary-ogg')
+
+
+def load_fixture(fixture_path: str):
+    formatter = PydubService()
+    audio = formatter.read_audio_from_file(fixture_path)
+    return formatter, formatter.write_audio_into_buffer(audio, PCM_FORMAT, SAMPLE_RATE)
+
+
+def encode_sentence(mode: str, formatter, pcm, frame_encoder: BinaryFrameEncoder):
+    if mode == 'json':
+        return [make_json_frame(formatter.processing_buffer(pcm, PCM_FORMAT, 'wav', SAMPLE_RATE))]
+    if mode == 'binary-ogg':
+        payload = formatter.processing_buffer(pcm, PCM_FORMAT, 'ogg', SAMPLE_RATE)
+        return frame_encoder.encode(payload, 'stream', 'ogg', 0, SAMPLE_RATE)
+    return frame_encoder.encode(pcm_to_pcm16(pcm), 'stream', 'pcm16', 0, SAMPLE_RATE)
+
+
+async def measure(mode: str, formatter, pcm, bandwidth: float, chunk_size: int):
+    frame_encoder = BinaryFrameEncoder(chunk_size)
+
+    async def handler(websocket):
+        async for _ in websocket:
+            for frame in encode_sentence(mode, formatter, pcm, frame_encoder):
+                if bandwidth:
+                    await asyncio.sleep(len(frame) / bandwidth)
+                await websocket.send(frame)
+
+    async with websockets.serve(handler, 'localhost', 0) as server:
+        port = server.sockets[0].getsockname()[1]
+        async with websockets.connect(f'ws://localhost:{port}', max_size=None) as client:
+            started_at = time.perf_counter()
+            await client.send('start')
+            bytes_on_wire = 0
+            time_to_first_audio = None
+            while True:
+                message = await client.recv()
+                if isinstance(message, str):
+                    bytes_on_wire += len(message.encode('utf-8'))
+                    base64.b64decode(json.loads(message)['data'])
+                    time_to_first_audio = time.perf_counter() - started_at
+                    break
+                bytes_on_wire += len(message)
+                header, _ = decode_frame(message)
+                # PCM chunks are playable on arrival, Opus needs the whole ogg container
+                if time_to_first_audio is None and (mode == 'binary-pcm16' or header['is_last']):
+                    time_to_first_audio = time.perf_counter() - started_at
+                if header['is_last']:
+                    break
+    return bytes_on_wire, time_to_first_audio
+
+
+async def run(args):
+    formatter, pcm = load_fixture(args.fixture)
+    print(f'Fixture {args.fixture}: {len(pcm) / SAMPLE_RATE:.2f}s, bandwidth {args.bandwidth or "unlimited"} B/s')
+    for mode in MODES:
+        results = [await measure(mode, formatter, pcm, args.bandwidth, args.chunk_size) for _ in range(args.repeats)]
+        bytes_on_wire = results[0][0]
+        times = [time_to_first_audio for _, time_to_first_audio in results]
+        print(
+            f'{mode:>13}: bytes_on_wire={bytes_on_wire} '
+            f'time_to_first_audio median={statistics.median(times) * 1000:.1f}ms max={max(times) * 1000:.1f}ms'
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bytes on the wire and time to first audio of websocket framings')
+    parser.add_argument('--fixture', default=os.path.join('sentences', '3be945486bb259f472499d9af879ac8d.wav'))
+    parser.add_argument('--bandwidth', type=float, default=250_000, help='simulated link speed in bytes/s, 0 for none')
+    parser.add_argument('--chunk-size', type=int, default=16 * 1024)
+    parser.add_argument('--repeats', type=int, default=5)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,22 +1,44 @@
 from telegram import Update
 from telegram.ext import filters, Application, CommandHandler, CallbackContext, MessageHandler
 
-from config import TELEGRAM_BOT_TOKEN
+from config import METRICS_HOST, TELEGRAM_BOT_METRICS_PORT, TELEGRAM_BOT_TOKEN, require_env
 
 from src.generative_ai.services import LangChainService
-from src.speech2text.services import WhisperService
-from src.fs_manager.services import TelegramBotApiArtifactsIO
-from src.audio_formatter.services import PydubService
+from src.speech2text.services import make_speech_to_text
+from src.fs_manager.services import Artifact, TelegramBotApiArtifactsIO
+from src.audio_formatter.services import PCM_FORMAT, PydubService
 from src.text2speech.services import XTTSService
 from src.telegram_api.services import user_verification
-from src.shared.hash import md5_hash
+from src.voice_activity.services import EnergyVADService
+from src.pipeline.services import StageExecutor, VoiceReplyPipeline
+from src.inference.services import InferenceQueueFull, InferenceScheduler
+from src.admission.services import AdmissionController, AdmissionRejected
+from src.registry.services import ModelRegistry
+from src.tracing.services import start_metrics_server, tracer
 
 
-speech_to_text = WhisperService()
-text_to_speech = XTTSService()
+# Models are built in parallel and warmed up by main, importing this module loads nothing heavy.
+registry = ModelRegistry()
+registry.register('stt', make_speech_to_text)
+registry.register('tts', XTTSService)
+registry.register('llm', LangChainService)
+
 file_system = TelegramBotApiArtifactsIO()
 formatter = PydubService()
-langchain = LangChainService()
+voice_activity = EnergyVADService()
+
+# Models are not thread-safe, so every model gets its own single worker shared by all chats.
+# STT requests of concurrent chats are micro-batched into one Whisper decode. XTTS generates every sentence
+# on its own, so TTS requests are plain calls served one at a time and nobody waits for unrelated sentences.
+stt_scheduler = InferenceScheduler('stt', lambda requests: registry.get('stt').analyze_batch(requests))
+tts_scheduler = InferenceScheduler('tts')
+encoder_stage = StageExecutor('encoder', max_workers=2)
+reply_pipeline = VoiceReplyPipeline(tts_stage=tts_scheduler, encoder_stage=encoder_stage)
+# Bounds voice messages in progress per user and in total, the rest get a busy reply instead of a late answer
+admission = AdmissionController('telegram')
+
+BUSY_REPLY = 'I am busy with other messages, please, try again a bit later.'
+DROPPED_REPLY = 'I skipped this message to answer your latest one.'
 
 
 async def verify_user(update: Update) -> None:
@@ -32,8 +54,6 @@ async def start(update: Update, _: CallbackContext) -> None:
 async def handle_audio(update: Update, context: CallbackContext) -> None:
     await verify_user(update)
 
-    artifact_paths = []
-
     user_id: str = str(update.effective_user.id)  # type: ignore
     chat_id = update.message.chat_id  # type: ignore
     voice_message = update.message.voice  # type: ignore
@@ -42,33 +62,76 @@ async def handle_audio(update: Update, context: CallbackContext) -> None:
         await update.message.reply_text('Please, send me audio file.')  # type: ignore
         return
 
-    input_file_path = await file_system.write_user_audio_file(user_id, voice_message)
-    artifact_paths.append(input_file_path)
-    output_file_path = formatter.processing(input_file_path, '.wav')  # type: ignore
-    artifact_paths.append(output_file_path)
-    text_message = speech_to_text.transcribe(output_file_path)
+    text_to_speech = registry.get('tts')
+
+    def encode(pcm) -> bytes:
+        return formatter.processing_buffer(pcm, PCM_FORMAT, 'ogg', sample_rate=text_to_speech.sample_rate)
+
+    async def send(ogg_ai_answer: bytes):
+        await send_voice_message(context=context, chat_id=chat_id, voice=ogg_ai_answer)
+
+    tracer.start_request(session_id=user_id)
+    try:
+        async with admission.admit(user_id), file_system.scope(user_id) as artifacts:
+            with tracer.span('telegram_request'):
+                with tracer.span('download'):
+                    input_artifact = await file_system.write_user_audio_file(artifacts, voice_message)
+                pcm = await decode_voice(input_artifact)
+                with tracer.span('vad'):
+                    is_speech = voice_activity.is_speech(pcm)
+                if not is_speech:
+                    await update.message.reply_text('I can not hear anything, please, try again.')  # type: ignore
+                    return
+                analysis = await stt_scheduler.run_batched((pcm, None))
+                text_message = analysis['text']
+
+                llm = registry.get('llm')
+                sentences = llm.aask_model(text_message, session_id=user_id, remember=False)
+                stats = await reply_pipeline.run(sentences, text_to_speech.synthesize, encode, send)
+                llm.confirm_turn(user_id)
+    except (AdmissionRejected, InferenceQueueFull) as error:
+        print(f'Voice message of {user_id} is not served: {error}')
+        is_dropped = isinstance(error, AdmissionRejected) and error.reason == 'dropped'
+        await update.message.reply_text(DROPPED_REPLY if is_dropped else BUSY_REPLY)  # type: ignore
+        return
+    print(f'Replied to {user_id} with {stats["sentences"]} sentences, first in {stats["time_to_first_reply"]}s')
+
+
+async def decode_voice(voice_artifact: Artifact):
+    """
+    Decodes the OGG/Opus voice note to 16 kHz PCM, from memory unless it was spilled to disk
+    """
+    if voice_artifact.is_spilled:
+        return await encoder_stage.run(decode_voice_file, await voice_artifact.get_path())
+    return await encoder_stage.run(formatter.processing_buffer, await voice_artifact.read(), 'ogg', PCM_FORMAT)
+
+
+def decode_voice_file(input_file_path: str):
+    with tracer.span('audio_decode', input_format='ogg', output_format=PCM_FORMAT):
+        audio = formatter.read_audio_from_file(input_file_path)
+        return formatter.write_audio_into_buffer(audio, PCM_FORMAT)
 
-    for text_sentence in langchain.ask_model(text_message):
-        sentence_hash = md5_hash(text_sentence)
-        wav_ai_answer_filepath = file_system.make_user_artifact_file_path(
-            user_id=user_id, filename=f'{sentence_hash}.wav'
-        )
-        artifact_paths.append(wav_ai_answer_filepath)
-        text_to_speech.processing(wav_ai_answer_filepath, text_sentence)
-        ogg_ai_answer_filepath = formatter.processing(wav_ai_answer_filepath, '.ogg')
-        artifact_paths.append(ogg_ai_answer_filepath)
-        await send_voice_message(context=context, chat_id=chat_id, file_path=ogg_ai_answer_filepath)
 
-    file_system.delete_artifacts(user_id=user_id, filename_array=artifact_paths)
+async def send_voice_message(context: CallbackContext, chat_id, voice: bytes):
+    await context.bot.send_voice(chat_id=chat_id, voice=voice)
 
 
-async def send_voice_message(context: CallbackContext, chat_id, file_path: str):
-    with open(file_path, 'rb') as voice_file:
-        await context.bot.send_voice(chat_id=chat_id, voice=voice_file)
+async def start_background_tasks(_: Application) -> None:
+    file_system.start_sweeper()
 
 
 def main() -> None:
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+    require_env('TELEGRAM_BOT_TOKEN', 'TELEGRAM_BOT_ALLOWED_USERS')
+    registry.load_all()
+    start_metrics_server(METRICS_HOST, TELEGRAM_BOT_METRICS_PORT)
+
+    application = (
+        Application.builder()
+        .token(TELEGRAM_BOT_TOKEN)
+        .concurrent_updates(True)
+        .post_init(start_background_tasks)
+        .build()
+    )
 
     application.add_handler(CommandHandler('start', start))
     application.add_handler(MessageHandler(filters.VOICE & ~filters.COMMAND, handle_audio))
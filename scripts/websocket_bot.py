@@ -1,60 +1,92 @@
-import base64
-import json
-import os
-import random
-import time
+import itertools
+import uuid
 import asyncio
 import websockets
 
-from src.shared.hash import md5_hash
-from src.fs_manager.services import WebSocketsBotArtifactsIO
+import numpy as np
+
 from src.generative_ai.services import LangChainService
-from src.speech2text.services import WhisperService
-from src.audio_formatter.services import PydubService
+from src.speech2text.services import make_speech_to_text
+from src.audio_formatter.services import PCM_FORMAT, PCM_SAMPLE_RATE, PydubService
+from src.audio_formatter.buffers import UtteranceBuffer
+from src.audio_formatter.streaming import StreamingDecoder
 from src.text2speech.services import XTTSService
-
-from config import AUDIO_CAPTURE_KEY_WORD, WS_HOST, WS_PORT
-
-READINESS_PHRASES_FILES = [
-    '3be945486bb259f472499d9af879ac8d.wav',
-    '007d4202dfa5ae38e1b5140090f47c2e.wav',
-    '8d2291b8c6af8c2a6f81bbd9e4a6022e.wav',
-    '8e3a0a1df2a45d2ad0734de30a761994.wav',
-    '14d1954b6d2b2272bf0ca840e03aa2bd.wav',
-    '23e71d22ba3c8c3daca23f21274d7856.wav',
-    '66b26aad7ce0746f1cb19ae5f82fbed1.wav',
-    '87abd187363e74cbc9aafb11ecb66420.wav',
-    '4017f52f65fefdfd09123a3754048e21.wav',
-    'aea108281140139cbedfd6ced91c9ed5.wav',
-    'c0c6cf031b766f9652548b83f05d6e02.wav',
-    'c107e2ce93aee12e68107b54c50706e7.wav',
-]
+from src.voice_activity.services import EnergyVADService
+from src.phrases.services import PhrasesRegistry
+from src.keyword_spotting.services import OverlappingWindows, make_keyword_spotter
+from src.websocket_api.services import (
+    BINARY_FRAMING,
+    JSON_FRAMING,
+    BinaryFrameEncoder,
+    make_busy_frame,
+    make_cancel_frame,
+    make_json_frame,
+    parse_control_message,
+    pcm_to_pcm16,
+)
+from src.pipeline.services import FairScheduler, StageExecutor, VoiceReplyPipeline
+from src.inference.services import InferenceQueueFull, InferenceScheduler
+from src.admission.services import AdmissionController, AdmissionRejected
+from src.registry.services import ModelRegistry
+from src.tracing.services import metrics, start_metrics_server, tracer
+
+from config import METRICS_HOST, WS_AUDIO_MAX_LAG, WS_HOST, WS_METRICS_PORT, WS_PORT, require_env
 
 
 class WebSocketsBot:
-    _WS_TIME_THRESHOLD = 2
-    _RMS_THRESHOLD = 0.5
-    _NO_SPEECH_OFFSET_THRESHOLD = 1
-
-    def __init__(self):
-        self.websocket = None
-
-        self.speech_to_text = WhisperService()
-        self.text_to_speech = XTTSService()
-        self.fs_manager = WebSocketsBotArtifactsIO()
-
+    """
+    Owns the heavy models shared by all connections. Every connection gets its own WebSocketsSession,
+    STT requests of all sessions are micro-batched and TTS requests served in order by inference schedulers,
+    the other model calls are served round-robin by per-model schedulers.
+    Models are loaded in parallel and warmed up before the server starts listening, factories replace
+    the registered ones by name (e.g. stand-in models for benchmarks).
+    """
+
+    def __init__(self, factories: dict | None = None):
         self.formatter = PydubService()
-        self.langchain = LangChainService()
-
-        self.input_webm_buffer = []
-        self.input_filename_buffer = []
-        self.capture_voice_query = False
-        self.transcribe_voice_query = False
-        self.fe_answer_waiting = False
-        self.last_time_voice_collected = time.time()
-        self.no_speech_offset = 0
+        self.voice_activity = EnergyVADService()
+        self.frame_encoder = BinaryFrameEncoder()
+
+        self.registry = ModelRegistry()
+        # Created before the models load, the transcript keyword spotter shares the STT worker through it
+        self.stt_scheduler = InferenceScheduler(
+            'stt', lambda requests: self.registry.get('stt').analyze_batch(requests)
+        )
+        self.registry.register('stt', make_speech_to_text)
+        self.registry.register('tts', XTTSService)
+        self.registry.register('kws', lambda: make_keyword_spotter(self.stt_scheduler))
+        self.registry.register('llm', LangChainService)
+        self.registry.register('readiness_phrases', self.make_readiness_phrases)
+        for name, factory in (factories or {}).items():
+            self.registry.register(name, factory)
+        self.registry.load_all()
+
+        self.speech_to_text = self.registry.get('stt')
+        self.text_to_speech = self.registry.get('tts')
+        self.keyword_spotter = self.registry.get('kws')
+        self.langchain = self.registry.get('llm')
+        self.readiness_phrases = self.registry.get('readiness_phrases')
+
+        self.kws_scheduler = FairScheduler('kws')
+        # XTTS generates every sentence on its own, so TTS requests are plain calls served one at a time
+        self.tts_scheduler = InferenceScheduler('tts')
+        self.encoder_stage = StageExecutor('encoder', max_workers=4)
+        self.admission = AdmissionController('websocket')
+
+        self.sessions = {}
+
+    def make_readiness_phrases(self) -> PhrasesRegistry:
+        return PhrasesRegistry(
+            self.formatter,
+            frame_builders={
+                JSON_FRAMING: lambda phrase: make_json_frame(phrase['wav'], 'greetings'),
+                'pcm16': lambda phrase: self.frame_encoder.split(pcm_to_pcm16(phrase['pcm'])),
+                'ogg': lambda phrase: self.frame_encoder.split(phrase['ogg']),
+            },
+        )
 
     def start(self):
+        start_metrics_server(METRICS_HOST, WS_METRICS_PORT)
         asyncio.run(self.run_web_sockets())
 
     async def run_web_sockets(self):
@@ -62,173 +94,284 @@ class WebSocketsBot:
             await asyncio.Future()
 
     async def handler(self, websocket):
+        session = WebSocketsSession(self, websocket)
+        self.sessions[session.session_id] = session
+        metrics.set('websocket_sessions', len(self.sessions), 'Open websocket sessions')
+        print(f'Open session {session.session_id}, {len(self.sessions)} active')
+        try:
+            await session.serve()
+        finally:
+            await session.close()
+            del self.sessions[session.session_id]
+            metrics.set('websocket_sessions', len(self.sessions), 'Open websocket sessions')
+            self.kws_scheduler.forget(session.session_id)
+            self.langchain.forget(session.session_id)
+            print(f'Close session {session.session_id}, {len(self.sessions)} active')
+            print(f'Keyword spotting stats: {self.keyword_spotter.get_stats()}')
+
+
+class WebSocketsSession:
+    """
+    State of a single websocket connection: audio decoder and capture state machine.
+    Incoming webm chunks are decoded by one streaming decoder per session and handled in windows of PCM.
+    Audio lagging more than max_audio_lag behind the live stream is dropped, queries and answers go
+    through the bot's admission control and get a busy frame when they are not admitted.
+    """
+
+    _WINDOW_DURATION = 2
+    _QUERY_WAIT_TIMEOUT = 6
+    _BINARY_CODECS = ('pcm16', 'ogg')
+
+    def __init__(self, bot: WebSocketsBot, websocket) -> None:
+        self.bot = bot
         self.websocket = websocket
-        async for message in websocket:
+        self.session_id = uuid.uuid4().hex
+
+        self.speech_to_text = bot.speech_to_text
+        self.text_to_speech = bot.text_to_speech
+        self.formatter = bot.formatter
+        self.voice_activity = bot.voice_activity
+        self.keyword_spotter = bot.keyword_spotter
+        self.langchain = bot.langchain
+        self.readiness_phrases = bot.readiness_phrases
+        self.frame_encoder = bot.frame_encoder
+
+        self.stt_scheduler = bot.stt_scheduler
+        self.kws_stage = bot.kws_scheduler.for_session(self.session_id)
+        self.encoder_stage = bot.encoder_stage
+        self.admission = bot.admission
+        self.reply_pipeline = VoiceReplyPipeline(tts_stage=bot.tts_scheduler, encoder_stage=bot.encoder_stage)
+
+        self.decoder = StreamingDecoder()
+        self.capture_voice_query = False
+        self.transcribe_voice_query = False
+        self.fe_answer_waiting = False
+        self.silence_duration = 0.0
+        self.utterance = UtteranceBuffer()
+        self.key_word_windows = OverlappingWindows()
+        self.voice_worker = None
+        self.answer_task = None
+
+        self.framing = JSON_FRAMING
+        self.binary_codec = 'pcm16'
+        self.sequence = itertools.count()
+
+    async def serve(self):
+        self.voice_worker = asyncio.create_task(self.process_voice_windows())
+        async for message in self.websocket:
             if isinstance(message, str):
-                self.fe_answer_waiting = False
+                self.handle_text_message(message)
 
             if isinstance(message, bytes):
                 await self.audio_collector(message)
 
-    async def audio_collector(self, ws_message):
-        self.buffering_voice(ws_message)
-        if self.fe_answer_waiting == True:
-            return
-        if not self.is_time_to_collect_voice():
+    def handle_text_message(self, message: str):
+        control = parse_control_message(message)
+        if control and control.get('type') == 'hello':
+            self.framing = BINARY_FRAMING if control.get('framing') == BINARY_FRAMING else JSON_FRAMING
+            if control.get('codec') in self._BINARY_CODECS:
+                self.binary_codec = control['codec']
+            print(f'Session {self.session_id} uses {self.framing} framing')
             return
-        await self.write_collected_voice()
-        if not self.is_enough_voice_files_to_handle():
-            return
-        await self.handle_voice()
-
-    def buffering_voice(self, ws_message):
-        self.input_webm_buffer.append(ws_message)
-
-    def is_time_to_collect_voice(self, ws_time_threshold=_WS_TIME_THRESHOLD):
-        current_time = time.time()
-        if current_time - self.last_time_voice_collected < ws_time_threshold:
-            return False
-        self.last_time_voice_collected = current_time
-        return True
-
-    async def write_collected_voice(self):
-        filename = f'{self.last_time_voice_collected}.webm'
-        webm_file = await self.fs_manager.write_ws_audio_file(filename, self.input_webm_buffer)
-        self.input_filename_buffer.append(webm_file)
+        self.fe_answer_waiting = False
 
-    def is_enough_voice_files_to_handle(self):
-        return len(self.input_filename_buffer)
+    async def close(self):
+        if self.voice_worker:
+            self.voice_worker.cancel()
+            await asyncio.gather(self.voice_worker, return_exceptions=True)
+        await self.cancel_answer()
+        await self.decoder.close()
 
-    async def handle_voice(self):
+    async def audio_collector(self, ws_message):
+        # The webm stream stays continuous even while its audio is ignored, so every chunk is decoded
+        await self.decoder.feed(ws_message)
+
+    async def process_voice_windows(self, window_duration=_WINDOW_DURATION, max_audio_lag=WS_AUDIO_MAX_LAG):
+        window_samples = int(window_duration * PCM_SAMPLE_RATE)
+        while True:
+            if self.decoder.drop_stale(max(max_audio_lag, window_duration)):
+                # The overlap tail is no longer followed by the audio it was taken from
+                self.key_word_windows.reset()
+            pcm = await self.decoder.read(window_samples)
+            if self.fe_answer_waiting:
+                continue
+            await self.handle_voice(pcm)
+
+    async def handle_voice(self, pcm):
+        tracer.start_request(session_id=self.session_id)
         try:
-            raw_input_file_path = self.get_raw_voice_data()
-            wav_input_file_path = self.formatter.processing(raw_input_file_path, '.wav')
             if self.transcribe_voice_query:
-                raise
+                return
+            with tracer.span('vad'):
+                is_speech = self.voice_activity.is_speech(pcm)
+            if is_speech and self.is_answering():
+                await self.interrupt_answer()
             if self.capture_voice_query:
-                text = self.handle_voice_query(wav_input_file_path)
-                await self.handle_gpt_prompt(text)
+                text = await self.handle_voice_query(pcm, is_speech)
+                self.start_answer(text)
             else:
-                is_key_word = self.handle_key_word(wav_input_file_path)
+                is_key_word = await self.handle_key_word(pcm, is_speech)
                 await self.answer_with_readiness_phrase(is_key_word)
-        except:
-            pass
-        finally:
-            self.delete_file(wav_input_file_path)
-            self.delete_file(raw_input_file_path)
-            self.clear_raw_data_buffer()
+        except Exception as error:
+            print(f'Session {self.session_id} failed to handle voice: {error}')
 
-    async def handle_gpt_prompt(self, text_message):
+    def start_answer(self, text_message):
         if not text_message:
             return
-        for text_sentence in self.langchain.ask_model(text_message):
-            await self.produce_voice_messages(text_sentence)
-
-    async def produce_voice_messages(self, text_sentence):
-        sentence_hash = md5_hash(text_sentence)
-        wav_ai_answer_filepath = self.fs_manager.make_ws_artifact_file_path(filename=f'{sentence_hash}.wav')
-        self.text_to_speech.processing(wav_ai_answer_filepath, text_sentence)
-        await self.send_voice_message(wav_ai_answer_filepath)
-        self.delete_file(wav_ai_answer_filepath)
-
-    async def send_voice_message(self, wav_ai_answer_filepath, type='stream'):
-        with open(wav_ai_answer_filepath, 'rb') as file:
-            data = file.read()
-            if self.websocket:
-                audio_base64 = base64.b64encode(data).decode('utf-8')
-                data_json = {'type': type, 'data': audio_base64}
-                await self.websocket.send(json.dumps(data_json))
-
-    def get_raw_voice_data(self):
-        return self.input_filename_buffer.pop(0)
-
-    def clear_raw_data_buffer(self):
-        self.input_webm_buffer = self.input_webm_buffer[:1]
-
-    def handle_voice_query(self, output_file_path):
-        if self.is_enough_speech(output_file_path):
-            self.clear_no_speech_offset()
-            audio = self.formatter.read_audio_from_file(output_file_path)
-            self.write_spec_wav(audio)
-            return None
-        else:
-            if self.is_necessary_to_postpone_transcribing():
-                return None
+        self.answer_task = asyncio.create_task(self.handle_gpt_prompt(text_message))
 
-        self.transcribe_voice_query = True
-        try:
-            return self.transcribe_query()
-        except:
-            pass
-        finally:
-            self.capture_voice_query = False
-            self.transcribe_voice_query = False
+    def is_answering(self) -> bool:
+        return self.answer_task is not None and not self.answer_task.done()
 
-    def clear_no_speech_offset(self):
-        self.no_speech_offset = 0
+    async def cancel_answer(self):
+        if not self.is_answering():
+            return
+        self.answer_task.cancel()  # type: ignore
+        await asyncio.gather(self.answer_task, return_exceptions=True)  # type: ignore
+
+    async def interrupt_answer(self):
+        """
+        Barge-in: the user speaks over the answer, so the stale answer is dropped in every stage
+        and the new speech is captured as the next query
+        """
+        print(f'Session {self.session_id} interrupted the answer')
+        await self.cancel_answer()
+        await self.websocket.send(make_cancel_frame())
+        self.utterance.clear()
+        self.silence_duration = 0.0
+        self.capture_voice_query = True
 
-    def is_necessary_to_postpone_transcribing(self, no_speech_offset_threshold=_NO_SPEECH_OFFSET_THRESHOLD):
-        print(f'Postpone {self.no_speech_offset}')
-        if self.no_speech_offset < no_speech_offset_threshold:
-            self.no_speech_offset += 1
-            return True
+    async def handle_gpt_prompt(self, text_message):
+        try:
+            async with self.admission.admit(self.session_id):
+                await self.answer(text_message)
+        except (AdmissionRejected, InferenceQueueFull) as error:
+            await self.send_busy(error)
+        except Exception as error:
+            print(f'Session {self.session_id} failed to answer: {error}')
+
+    async def answer(self, text_message):
+        # The answer is remembered only once it was sent completely, a barge-in cancels this task before
+        sentences = self.langchain.aask_model(text_message, session_id=self.session_id, remember=False)
+        if self.framing == BINARY_FRAMING and self.binary_codec == 'pcm16':
+            await self.reply_pipeline.run(
+                sentences,
+                self.stream_voice_message,
+                self.encode_voice_chunk,
+                self.send_frames,
+                stream_synthesis=True,
+            )
         else:
-            self.no_speech_offset = 0
-            return False
+            await self.reply_pipeline.run(
+                sentences,
+                self.text_to_speech.synthesize,
+                self.encode_voice_message,
+                self.send_frames,
+            )
+        self.langchain.confirm_turn(self.session_id)
+
+    def stream_voice_message(self, text_sentence):
+        sequence = next(self.sequence)
+        index = -1
+        for index, pcm in enumerate(self.text_to_speech.stream(text_sentence)):
+            yield sequence, index, pcm, False
+        yield sequence, index + 1, np.zeros(0, dtype=np.float32), True
+
+    def encode_voice_chunk(self, voice_chunk, type='stream'):
+        sequence, index, pcm, is_last = voice_chunk
+        sample_rate = self.text_to_speech.sample_rate
+        return [self.frame_encoder.make_frame(pcm_to_pcm16(pcm), type, 'pcm16', sequence, index, is_last, sample_rate)]
+
+    def encode_voice_message(self, pcm, type='stream'):
+        sample_rate = self.text_to_speech.sample_rate
+        if self.framing == JSON_FRAMING:
+            wav_data = self.formatter.processing_buffer(pcm, PCM_FORMAT, 'wav', sample_rate=sample_rate)
+            return [make_json_frame(wav_data, type)]
+
+        if self.binary_codec == 'ogg':
+            payload = self.formatter.processing_buffer(pcm, PCM_FORMAT, 'ogg', sample_rate=sample_rate)
+        else:
+            payload = pcm_to_pcm16(pcm)
+        return self.frame_encoder.encode(payload, type, self.binary_codec, next(self.sequence), sample_rate)
+
+    async def send_frames(self, frames):
+        for frame in frames:
+            await self.websocket.send(frame)
+
+    async def send_busy(self, error):
+        print(f'Session {self.session_id} is not served: {error}')
+        await self.websocket.send(make_busy_frame())
 
-    def transcribe_query(self):
-        print('Start Transcribing')
-        special_wav = self.fs_manager.get_spec_file()
-        text = self.speech_to_text.transcribe(special_wav, language='ru')
-        print(f'Finish transcribing')
-        self.delete_file(special_wav)
-        return text
+    async def handle_voice_query(self, pcm, is_speech):
+        if is_speech:
+            self.utterance.append(pcm)
+            self.silence_duration = self.voice_activity.get_trailing_silence(pcm)
+        else:
+            self.silence_duration += len(pcm) / PCM_SAMPLE_RATE
+        if not self.is_utterance_finished():
+            return None
 
-    def handle_key_word(self, input_file_path):
+        self.transcribe_voice_query = True
         try:
-            text = self.speech_to_text.transcribe(input_file_path, language='ru')
-            if text:
-                if AUDIO_CAPTURE_KEY_WORD in text:
-                    self.capture_voice_query = True
-                    print('Start Listen')
-                    return True
+            return await self.transcribe_query()
         except Exception as error:
             print(error)
+        finally:
+            self.capture_voice_query = False
+            self.transcribe_voice_query = False
+            self.silence_duration = 0.0
 
-    def is_enough_speech(self, file_path, rms_threshold=_RMS_THRESHOLD):
-        no_speech_prob = self.speech_to_text.get_no_speech_prob(file_path)
-        return no_speech_prob < rms_threshold
+    def is_utterance_finished(self, query_wait_timeout=_QUERY_WAIT_TIMEOUT):
+        if not len(self.utterance):
+            return self.silence_duration >= query_wait_timeout
+        return self.voice_activity.is_silence_long_enough(self.silence_duration)
 
-    def write_spec_wav(self, audio):
-        special_wav = self.fs_manager.get_spec_file()
-        try:
-            audio_origin = self.formatter.read_audio_from_file(special_wav)
-            self.formatter.write_audio_into_file(special_wav, audio_origin + audio)
-        except:
-            self.formatter.write_audio_into_file(special_wav, audio)
-
-    @staticmethod
-    def delete_file(file_path):
-        if not os.path.exists(file_path):
-            print(f'Cant find file to delete {file_path}')
-            return
+    async def transcribe_query(self):
+        if not len(self.utterance):
+            return None
         try:
-            os.remove(file_path)
-        except Exception as e:
-            print(f'Cannot delete {file_path}: {e}')
+            async with self.admission.admit(self.session_id):
+                with tracer.span('transcribe_query', audio_seconds=self.utterance.duration):
+                    analysis = await self.stt_scheduler.run_batched((self.utterance.get_pcm().copy(), 'ru'))
+            return analysis['text']
+        except (AdmissionRejected, InferenceQueueFull) as error:
+            await self.send_busy(error)
+            return None
+        finally:
+            self.utterance.clear()
 
-    def get_readiness_phrase_file(self, phrases_wav=READINESS_PHRASES_FILES):
-        phrase_wav_file = random.choice(phrases_wav)
-        return f'sentences/{phrase_wav_file}'
+    async def handle_key_word(self, pcm, is_speech):
+        window = self.key_word_windows.push(pcm)
+        if not is_speech:
+            return False
+        with tracer.span('keyword_spotting') as span:
+            span['detected'] = await self.kws_stage.run(self.keyword_spotter.detect, window)
+        if span['detected']:
+            self.key_word_windows.reset()
+            self.capture_voice_query = True
+            print('Start Listen')
+            return True
+        return False
 
     async def answer_with_readiness_phrase(self, is_key_word):
         if not is_key_word:
             return
-        readiness_phrase_wav = self.get_readiness_phrase_file()
-        await self.send_voice_message(readiness_phrase_wav, 'greetings')
+        readiness_phrase = self.readiness_phrases.choice()
+        if self.framing == JSON_FRAMING:
+            frames = [readiness_phrase['frames'][JSON_FRAMING]]
+        else:
+            frames = self.frame_encoder.make_frames(
+                readiness_phrase['frames'][self.binary_codec],
+                'greetings',
+                self.binary_codec,
+                next(self.sequence),
+                readiness_phrase['sample_rate'],
+            )
+        await self.send_frames(frames)
         self.fe_answer_waiting = True
 
 
 if __name__ == '__main__':
+    require_env('WS_HOST', 'WS_PORT', 'AUDIO_CAPTURE_KEY_WORD')
     ws_bot = WebSocketsBot()
     ws_bot.start()
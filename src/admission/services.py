@@ -0,0 +1,143 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+from config import (
+    ADMISSION_MAX_CONCURRENT_PER_USER,
+    ADMISSION_MAX_QUEUE_PER_USER,
+    ADMISSION_MAX_QUEUE_SIZE,
+    ADMISSION_MAX_WAIT,
+    ADMISSION_OVERFLOW_POLICY,
+)
+from src.tracing.services import metrics
+
+OVERFLOW_POLICIES = ('reject', 'drop_oldest')
+
+
+class AdmissionRejected(Exception):
+    """
+    Raised for a request that will not be served: busy (the queue is full), dropped (a newer request
+    of the same user took its place) or stale (it waited longer than it is worth answering).
+    """
+
+    def __init__(self, name: str, reason: str) -> None:
+        super().__init__(f'{name} request {reason}')
+        self.reason = reason
+
+
+class _UserSlots:
+    def __init__(self) -> None:
+        self.active = 0
+        self.waiters: deque[asyncio.Future] = deque()
+
+
+class AdmissionController:
+    """
+    Bounds the work a front-end accepts. Every user runs at most max_concurrent_per_user requests,
+    the rest wait in a per-user FIFO of max_queue_per_user and all waiting requests together are capped
+    by max_queue_size. A full per-user queue either rejects the new request as busy or drops the oldest
+    waiting one (overflow_policy), a full total queue always rejects. A request granted a slot after
+    waiting longer than max_wait is dropped as stale, so latency stays bounded under overload.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrent_per_user: int = ADMISSION_MAX_CONCURRENT_PER_USER,
+        max_queue_per_user: int = ADMISSION_MAX_QUEUE_PER_USER,
+        max_queue_size: int = ADMISSION_MAX_QUEUE_SIZE,
+        overflow_policy: str = ADMISSION_OVERFLOW_POLICY,
+        max_wait: float = ADMISSION_MAX_WAIT,
+    ) -> None:
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f'Unknown overflow policy {overflow_policy}')
+        self.name = name
+        self.max_concurrent_per_user = max_concurrent_per_user
+        self.max_queue_per_user = max_queue_per_user
+        self.max_queue_size = max_queue_size
+        self.overflow_policy = overflow_policy
+        self.max_wait = max_wait
+
+        self.users: dict[str, _UserSlots] = {}
+        self.waiting = 0
+        self.active = 0
+
+        metrics.add_collector(self._collect_metrics)
+
+    @asynccontextmanager
+    async def admit(self, user_id: str):
+        await self.acquire(user_id)
+        try:
+            yield
+        finally:
+            self.release(user_id)
+
+    async def acquire(self, user_id: str):
+        user = self.users.setdefault(user_id, _UserSlots())
+        if user.active < self.max_concurrent_per_user and not user.waiters:
+            user.active += 1
+            self.active += 1
+            return
+
+        if len(user.waiters) >= self.max_queue_per_user:
+            if self.overflow_policy == 'reject' or not user.waiters:
+                self._reject(user_id, 'busy')
+            self._drop(user, user.waiters.popleft(), 'dropped')
+        if self.waiting >= self.max_queue_size:
+            self._reject(user_id, 'busy')
+
+        waiter = asyncio.get_running_loop().create_future()
+        user.waiters.append(waiter)
+        self.waiting += 1
+        enqueued_at = time.perf_counter()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled() and waiter.exception() is None:
+                # The slot was handed over right before the cancellation
+                self.release(user_id)
+            elif waiter in user.waiters:
+                user.waiters.remove(waiter)
+                self.waiting -= 1
+                self._forget_idle(user_id)
+            raise
+
+        wait = time.perf_counter() - enqueued_at
+        metrics.observe('admission_wait_seconds', wait, 'Time requests wait for admission', front=self.name)
+        if wait > self.max_wait:
+            self.release(user_id)
+            self._reject(user_id, 'stale')
+
+    def release(self, user_id: str):
+        user = self.users[user_id]
+        while user.waiters:
+            waiter = user.waiters.popleft()
+            self.waiting -= 1
+            if not waiter.done():
+                # The slot passes to the next waiting request of the same user
+                waiter.set_result(True)
+                return
+        user.active -= 1
+        self.active -= 1
+        self._forget_idle(user_id)
+
+    def _drop(self, user: _UserSlots, waiter: asyncio.Future, reason: str):
+        self.waiting -= 1
+        metrics.inc('admission_rejected_total', help='Requests not admitted', front=self.name, reason=reason)
+        if not waiter.done():
+            waiter.set_exception(AdmissionRejected(self.name, reason))
+
+    def _reject(self, user_id: str, reason: str):
+        metrics.inc('admission_rejected_total', help='Requests not admitted', front=self.name, reason=reason)
+        self._forget_idle(user_id)
+        raise AdmissionRejected(self.name, reason)
+
+    def _forget_idle(self, user_id: str):
+        user = self.users.get(user_id)
+        if user is not None and not user.active and not user.waiters:
+            del self.users[user_id]
+
+    def _collect_metrics(self):
+        yield 'admission_queue_depth', 'gauge', 'Requests waiting for admission', {'front': self.name}, self.waiting
+        yield 'admission_active_requests', 'gauge', 'Admitted requests in progress', {'front': self.name}, self.active
@@ -0,0 +1,98 @@
+import numpy as np
+
+from src.audio_formatter.services import PCM_SAMPLE_RATE
+
+
+class UtteranceBuffer:
+    """
+    Growable mono float32 PCM buffer. Capacity doubles when full, so appending a window is amortized O(1)
+    and the accumulated utterance is never decoded or re-encoded.
+    """
+
+    _INITIAL_SECONDS = 10
+
+    def __init__(self, sample_rate: int = PCM_SAMPLE_RATE, initial_seconds: float = _INITIAL_SECONDS) -> None:
+        self.sample_rate = sample_rate
+        self.samples = np.zeros(int(sample_rate * initial_seconds), dtype=np.float32)
+        self.length = 0
+
+    def __len__(self) -> int:
+        return self.length
+
+    @property
+    def duration(self) -> float:
+        return self.length / self.sample_rate
+
+    def append(self, pcm: np.ndarray):
+        required = self.length + len(pcm)
+        if required > len(self.samples):
+            self._grow(required)
+        self.samples[self.length : required] = pcm
+        self.length = required
+
+    def get_pcm(self) -> np.ndarray:
+        """
+        Returns a view on the accumulated samples, valid until the next append or clear
+        """
+        return self.samples[: self.length]
+
+    def clear(self):
+        self.length = 0
+
+    def _grow(self, required: int):
+        capacity = max(len(self.samples) * 2, required)
+        samples = np.zeros(capacity, dtype=np.float32)
+        samples[: self.length] = self.samples[: self.length]
+        self.samples = samples
+
+
+class PcmRingBuffer:
+    """
+    Fixed-capacity mono float32 PCM FIFO. When the reader falls behind, the oldest samples are overwritten
+    and counted as dropped, so a stalled consumer never makes memory grow.
+    """
+
+    _CAPACITY_SECONDS = 30
+
+    def __init__(self, sample_rate: int = PCM_SAMPLE_RATE, capacity_seconds: float = _CAPACITY_SECONDS) -> None:
+        self.sample_rate = sample_rate
+        self.samples = np.zeros(int(sample_rate * capacity_seconds), dtype=np.float32)
+        self.start = 0
+        self.end = 0
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return self.end - self.start
+
+    @property
+    def capacity(self) -> int:
+        return len(self.samples)
+
+    def write(self, pcm: np.ndarray):
+        if len(pcm) > self.capacity:
+            self.dropped += len(pcm) - self.capacity
+            pcm = pcm[-self.capacity :]
+        overflow = len(self) + len(pcm) - self.capacity
+        if overflow > 0:
+            self.start += overflow
+            self.dropped += overflow
+
+        position = self.end % self.capacity
+        head = min(len(pcm), self.capacity - position)
+        self.samples[position : position + head] = pcm[:head]
+        self.samples[: len(pcm) - head] = pcm[head:]
+        self.end += len(pcm)
+
+    def read(self, count: int) -> np.ndarray:
+        count = min(count, len(self))
+        position = self.start % self.capacity
+        head = min(count, self.capacity - position)
+        pcm = np.concatenate((self.samples[position : position + head], self.samples[: count - head]))
+        self.start += count
+        return pcm
+
+    def skip(self, count: int):
+        self.start += min(count, len(self))
+
+    def clear(self):
+        self.start = self.end
@@ -0,0 +1,25 @@
+import numpy as np
+
+_ZERO_CROSSINGS = 8
+
+
+def resample_pcm(pcm: np.ndarray, source_rate: int, target_rate: int) -> np.ndarray:
+    """
+    Vectorized band-limited resampling of mono float32 PCM: a Hann-windowed sinc low-pass against aliasing
+    when downsampling, then linear interpolation onto the target sample grid.
+    """
+    pcm = np.asarray(pcm, dtype=np.float32)
+    if source_rate == target_rate or not len(pcm):
+        return pcm
+
+    if target_rate < source_rate:
+        # Cutoff at the target Nyquist frequency, in cycles per source sample
+        cutoff = target_rate / source_rate / 2
+        half_width = int(np.ceil(_ZERO_CROSSINGS / (2 * cutoff)))
+        taps = np.arange(-half_width, half_width + 1)
+        kernel = 2 * cutoff * np.sinc(2 * cutoff * taps) * np.hanning(len(taps))
+        pcm = np.convolve(pcm, kernel / kernel.sum(), mode='same')
+
+    target_length = int(round(len(pcm) * target_rate / source_rate))
+    positions = np.arange(target_length) * (source_rate / target_rate)
+    return np.interp(positions, np.arange(len(pcm)), pcm).astype(np.float32)
@@ -1,10 +1,20 @@
 from abc import ABC, abstractmethod
+import io
 import os
 
-from src.shared.exceptions import DoNotImplementedException
+import numpy as np
+
+from src.audio_formatter.resampling import resample_pcm
+from src.shared.exceptions import DoNotImplementedException, UnsupportedAudioFormatException
+from src.tracing.services import tracer
+
+PCM_FORMAT = 'pcm'
+PCM_SAMPLE_RATE = 16000
 
 
 class BaseService(ABC):
+    _BUFFER_FORMATS = ('ogg', 'wav', 'webm')
+
     def __init__(self, model):
         self.formatter = model
 
@@ -31,7 +41,7 @@ class BaseService(ABC):
         elif file_extension == '.webm':
             return self.read_webm_file(input_file_path)
         else:
-            raise Exception
+            raise UnsupportedAudioFormatException(file_extension)
 
     @abstractmethod
     def read_ogg_file(self, input_file_path):
@@ -52,7 +62,7 @@ class BaseService(ABC):
         elif file_extension == '.ogg':
             self.write_ogg_file(output_file_path, audio)
         else:
-            raise Exception
+            raise UnsupportedAudioFormatException(file_extension)
 
     @abstractmethod
     def write_wav_file(self, output_file_path: str, audio):
@@ -62,6 +72,48 @@ class BaseService(ABC):
     def write_ogg_file(self, output_file_path: str, audio):
         raise DoNotImplementedException()
 
+    def processing_buffer(self, input_audio, input_format: str, output_format: str, sample_rate: int = PCM_SAMPLE_RATE):
+        """
+        In-memory counterpart of processing. Input audio is bytes, a file-like object or a float32 NumPy PCM
+        array (input_format='pcm'). Returns encoded bytes, or a mono float32 NumPy array for output_format='pcm'
+        """
+        stage = 'audio_decode' if output_format == PCM_FORMAT else 'audio_encode'
+        with tracer.span(stage, input_format=input_format, output_format=output_format):
+            audio = self.read_audio_from_buffer(input_audio, input_format, sample_rate)
+            return self.write_audio_into_buffer(audio, output_format, sample_rate)
+
+    def read_audio_from_buffer(self, input_audio, input_format: str, sample_rate: int = PCM_SAMPLE_RATE):
+        if input_format == PCM_FORMAT:
+            return self.read_pcm(input_audio, sample_rate)
+        if input_format not in self._BUFFER_FORMATS:
+            raise UnsupportedAudioFormatException(input_format)
+        if isinstance(input_audio, (bytes, bytearray, memoryview)):
+            input_audio = io.BytesIO(input_audio)
+        return self.read_buffer(input_audio, input_format)
+
+    def write_audio_into_buffer(self, audio, output_format: str, sample_rate: int = PCM_SAMPLE_RATE):
+        if output_format == PCM_FORMAT:
+            return self.write_pcm(audio, sample_rate)
+        if output_format not in ('wav', 'ogg'):
+            raise UnsupportedAudioFormatException(output_format)
+        return self.write_buffer(audio, output_format)
+
+    @abstractmethod
+    def read_buffer(self, input_buffer, input_format: str):
+        raise DoNotImplementedException()
+
+    @abstractmethod
+    def read_pcm(self, pcm: np.ndarray, sample_rate: int):
+        raise DoNotImplementedException()
+
+    @abstractmethod
+    def write_buffer(self, audio, output_format: str) -> bytes:
+        raise DoNotImplementedException()
+
+    @abstractmethod
+    def write_pcm(self, audio, sample_rate: int) -> np.ndarray:
+        raise DoNotImplementedException()
+
 
 class PydubService(BaseService):
     def __init__(self) -> None:
@@ -86,3 +138,24 @@ class PydubService(BaseService):
 
     def write_ogg_file(self, output_file_path: str, audio):
         audio.export(output_file_path, format="ogg")
+
+    def read_buffer(self, input_buffer, input_format: str):
+        audio = self.formatter.from_file(input_buffer, format=input_format)
+        return audio
+
+    def read_pcm(self, pcm: np.ndarray, sample_rate: int):
+        samples = (np.clip(pcm, -1.0, 1.0) * 32767).astype('<i2')
+        return self.formatter(data=samples.tobytes(), sample_width=2, frame_rate=sample_rate, channels=1)
+
+    def write_buffer(self, audio, output_format: str) -> bytes:
+        output_buffer = io.BytesIO()
+        if output_format == 'ogg':
+            audio.export(output_buffer, format='ogg', codec='libopus')
+        else:
+            audio.export(output_buffer, format=output_format)
+        return output_buffer.getvalue()
+
+    def write_pcm(self, audio, sample_rate: int) -> np.ndarray:
+        audio = audio.set_channels(1).set_sample_width(2)
+        pcm = np.frombuffer(audio.raw_data, dtype='<i2').astype(np.float32) / 32768.0
+        return resample_pcm(pcm, audio.frame_rate, sample_rate)
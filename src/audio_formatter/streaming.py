@@ -0,0 +1,128 @@
+import asyncio
+
+import numpy as np
+
+from src.audio_formatter.buffers import PcmRingBuffer
+from src.audio_formatter.services import PCM_SAMPLE_RATE
+from src.tracing.services import metrics
+
+
+class StreamingDecoder:
+    """
+    Long-lived ffmpeg process decoding one continuous compressed stream (e.g. MediaRecorder webm chunks)
+    to mono PCM. Chunks are written to its stdin as they arrive and decoded samples are collected into
+    a ring buffer, so no window is re-muxed, decoded by a new process or written to disk.
+    """
+
+    _READ_SIZE = 8192
+    _CLOSE_TIMEOUT = 2
+
+    def __init__(
+        self,
+        sample_rate: int = PCM_SAMPLE_RATE,
+        ring_seconds: float = PcmRingBuffer._CAPACITY_SECONDS,
+        ffmpeg_path: str = 'ffmpeg',
+    ) -> None:
+        self.sample_rate = sample_rate
+        self.ffmpeg_path = ffmpeg_path
+        self.ring = PcmRingBuffer(sample_rate, ring_seconds)
+        self.data_available = asyncio.Event()
+        self.process: asyncio.subprocess.Process | None = None
+        self.reader: asyncio.Task | None = None
+        self.header: bytes | None = None
+        self.remainder = b''
+        self.dropped = 0
+
+    async def feed(self, data: bytes):
+        """
+        Writes the next chunk of the stream. The first chunk carries the container header, it is replayed
+        if ffmpeg has to be restarted after a broken chunk.
+        """
+        if self.header is None:
+            self.header = data
+        elif not self.is_running():
+            await self._start(replay_header=True)
+        if self.process is None:
+            await self._start()
+        try:
+            self.process.stdin.write(data)  # type: ignore
+            await self.process.stdin.drain()  # type: ignore
+        except (BrokenPipeError, ConnectionResetError) as error:
+            print(f'Streaming decoder stopped: {error}')
+            await self._stop()
+
+    async def read(self, count: int) -> np.ndarray:
+        """
+        Waits until count samples are decoded and returns them
+        """
+        while len(self.ring) < count:
+            self.data_available.clear()
+            await self.data_available.wait()
+        return self.ring.read(count)
+
+    def drop_stale(self, max_lag: float) -> float:
+        """
+        Drops the oldest decoded samples when the consumer lags more than max_lag seconds behind the
+        live audio, and returns the dropped duration
+        """
+        stale = len(self.ring) - int(max_lag * self.sample_rate)
+        if stale <= 0:
+            return 0.0
+        self.ring.skip(stale)
+        dropped = stale / self.sample_rate
+        metrics.inc('stale_audio_dropped_seconds_total', dropped, 'Decoded audio dropped as too old to matter')
+        return dropped
+
+    def is_running(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+
+    async def close(self):
+        await self._stop()
+
+    async def _start(self, replay_header: bool = False):
+        await self._stop()
+        self.process = await asyncio.create_subprocess_exec(
+            self.ffmpeg_path,
+            '-loglevel', 'error',
+            '-fflags', 'nobuffer',
+            '-probesize', '32768',
+            '-analyzeduration', '0',
+            '-i', 'pipe:0',
+            '-f', 's16le',
+            '-ac', '1',
+            '-ar', str(self.sample_rate),
+            'pipe:1',
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        self.remainder = b''
+        self.reader = asyncio.create_task(self._read_output(self.process))
+        if replay_header and self.header is not None:
+            metrics.inc('streaming_decoder_restarts_total', help='Streaming decoder restarts after broken input')
+            self.process.stdin.write(self.header)  # type: ignore
+
+    async def _stop(self):
+        process, self.process = self.process, None
+        if process is not None and process.returncode is None:
+            try:
+                process.stdin.close()  # type: ignore
+                await asyncio.wait_for(process.wait(), self._CLOSE_TIMEOUT)
+            except (asyncio.TimeoutError, BrokenPipeError, ConnectionResetError):
+                process.kill()
+                await process.wait()
+        if self.reader is not None:
+            await asyncio.gather(self.reader, return_exceptions=True)
+            self.reader = None
+
+    async def _read_output(self, process: asyncio.subprocess.Process):
+        while chunk := await process.stdout.read(self._READ_SIZE):  # type: ignore
+            data = self.remainder + chunk
+            usable = len(data) - len(data) % 2
+            self.remainder = data[usable:]
+            self.ring.write(np.frombuffer(data[:usable], dtype='<i2').astype(np.float32) / 32768.0)
+            if self.ring.dropped > self.dropped:
+                dropped = (self.ring.dropped - self.dropped) / self.sample_rate
+                metrics.inc('pcm_ring_dropped_seconds_total', dropped, 'Decoded audio dropped by a slow consumer')
+                self.dropped = self.ring.dropped
+            self.data_available.set()
@@ -0,0 +1,161 @@
+import asyncio
+import tempfile
+import time
+import wave
+
+import numpy as np
+
+from src.audio_formatter.services import PCM_SAMPLE_RATE
+from src.keyword_spotting.services import BaseService as BaseKeywordSpotter
+from src.speech2text.services import AudioInput, BaseService as BaseSpeechToText
+from src.text2speech.cache import SynthesisCache
+from src.text2speech.services import BaseService as BaseTextToSpeech
+
+FAKE_QUESTION = 'Какая завтра будет погода?'
+FAKE_ANSWER = [
+    'Завтра будет облачно.',
+    'Днём около пятнадцати градусов, ветер слабый.',
+    'Вечером возможен небольшой дождь, так что лучше взять зонт.',
+]
+
+
+class FakeWhisperService(BaseSpeechToText):
+    """
+    Deterministic stand-in for WhisperService: sleeps for a fixed delay plus a share of the audio duration
+    and returns the same text for every clip.
+    """
+
+    def __init__(self, delay: float = 0.2, real_time_factor: float = 0.1, text: str = FAKE_QUESTION) -> None:
+        super().__init__(None)
+        self.delay = delay
+        self.real_time_factor = real_time_factor
+        self.text = text
+
+    def use_model(self, audio: AudioInput, language=None) -> dict:
+        return self.analyze(audio, language=language)
+
+    def analyze(self, audio: AudioInput, language=None) -> dict:
+        time.sleep(self.delay + self.real_time_factor * self.get_duration(audio))
+        return self.make_analysis(language)
+
+    def analyze_batch(self, requests: list[tuple[AudioInput, str | None]]) -> list[dict]:
+        longest_duration = max(self.get_duration(audio) for audio, _ in requests)
+        time.sleep(self.delay + self.real_time_factor * longest_duration)
+        return [self.make_analysis(language) for _, language in requests]
+
+    def transcribe(self, audio: AudioInput, language=None) -> str:
+        return self.analyze(audio, language=language)['text']
+
+    def get_no_speech_prob(self, audio: AudioInput, language=None) -> float:
+        return self.analyze(audio, language=language)['no_speech_prob']
+
+    def make_analysis(self, language=None) -> dict:
+        return {'text': self.text, 'segments': [], 'language': language, 'no_speech_prob': 0.0}
+
+    @staticmethod
+    def get_duration(audio: AudioInput) -> float:
+        return 0.0 if isinstance(audio, str) else len(audio) / PCM_SAMPLE_RATE
+
+
+class FakeXTTSService(BaseTextToSpeech):
+    """
+    Deterministic stand-in for XTTSService: every sentence lasts len(text) / chars_per_second seconds,
+    the first chunk is ready after first_chunk_delay and the rest is produced at real_time_factor.
+    """
+
+    _SAMPLE_RATE = 24000
+    _STREAM_CHUNK_DURATION = 0.5
+
+    def __init__(
+        self,
+        first_chunk_delay: float = 0.3,
+        real_time_factor: float = 0.5,
+        chars_per_second: float = 15.0,
+        sample_rate: int = _SAMPLE_RATE,
+    ) -> None:
+        super().__init__(None)
+        self.first_chunk_delay = first_chunk_delay
+        self.real_time_factor = real_time_factor
+        self.chars_per_second = chars_per_second
+        self._sample_rate = sample_rate
+        self.cache = SynthesisCache(cache_path=tempfile.mkdtemp(), memory_items=0, disk_size_limit=0)
+
+    @property
+    def sample_rate(self) -> int:
+        return self._sample_rate
+
+    def processing(self, path_to_output_wav: str, text: str):
+        pcm16 = (self.synthesize(text) * 32767).astype('<i2')
+        with wave.open(path_to_output_wav, 'wb') as wav_file:
+            wav_file.setnchannels(1)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(self.sample_rate)
+            wav_file.writeframes(pcm16.tobytes())
+
+    def synthesize(self, text: str, **kwargs) -> np.ndarray:
+        return np.concatenate(list(self.render(text)))
+
+    def stream(self, text: str, **kwargs):
+        yield from self.render(text)
+
+    def render(self, text: str):
+        duration = max(len(text) / self.chars_per_second, self._STREAM_CHUNK_DURATION)
+        chunk_count = int(np.ceil(duration / self._STREAM_CHUNK_DURATION))
+        time.sleep(self.first_chunk_delay)
+        for index in range(chunk_count):
+            if index:
+                time.sleep(self._STREAM_CHUNK_DURATION * self.real_time_factor)
+            yield self.make_tone(self._STREAM_CHUNK_DURATION)
+
+    def make_tone(self, duration: float) -> np.ndarray:
+        timeline = np.arange(int(duration * self.sample_rate), dtype=np.float32) / self.sample_rate
+        return (0.1 * np.sin(2 * np.pi * 220 * timeline)).astype(np.float32)
+
+
+class FakeLangChainService:
+    """
+    Deterministic stand-in for LangChainService streaming a fixed answer sentence by sentence
+    """
+
+    def __init__(
+        self,
+        first_sentence_delay: float = 0.4,
+        sentence_delay: float = 0.3,
+        answer: list[str] | None = None,
+    ) -> None:
+        self.first_sentence_delay = first_sentence_delay
+        self.sentence_delay = sentence_delay
+        self.answer = answer or FAKE_ANSWER
+
+    def ask_model(self, question: str, session_id: str = 'default', remember: bool = True):
+        for index, sentence in enumerate(self.answer):
+            time.sleep(self.sentence_delay if index else self.first_sentence_delay)
+            yield sentence
+
+    async def aask_model(self, question: str, session_id: str = 'default', remember: bool = True):
+        for index, sentence in enumerate(self.answer):
+            await asyncio.sleep(self.sentence_delay if index else self.first_sentence_delay)
+            yield sentence
+
+    def confirm_turn(self, session_id: str = 'default'):
+        pass
+
+    def forget(self, session_id: str):
+        pass
+
+    def get_turn_metrics(self) -> list[dict]:
+        return []
+
+
+class FakeKeywordSpotter(BaseKeywordSpotter):
+    """
+    Detects the key word in every window after a fixed delay
+    """
+
+    def __init__(self, delay: float = 0.05) -> None:
+        super().__init__(None, 'fake', PCM_SAMPLE_RATE)
+        self.delay = delay
+
+    def spot(self, pcm: np.ndarray) -> bool:
+        time.sleep(self.delay)
+        return True
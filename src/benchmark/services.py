@@ -0,0 +1,195 @@
+import contextvars
+import functools
+import json
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from threading import Lock
+
+import numpy as np
+
+from src.keyword_spotting.services import normalize_text
+
+_current_request: contextvars.ContextVar[dict | None] = contextvars.ContextVar('benchmark_request', default=None)
+
+TTFA_PERCENTILES = (50, 90, 99)
+STAGE_PERCENTILES = (50, 95)
+
+
+class LatencyRecorder:
+    """
+    Collects call durations per pipeline stage and time to first audio per request.
+    Stages are measured by wrapping service methods in place, so the bots run unchanged.
+    """
+
+    def __init__(self) -> None:
+        self.lock = Lock()
+        self.stages: defaultdict[str, list[float]] = defaultdict(list)
+        self.time_to_first_audio: list[float] = []
+        self.unanswered = 0
+
+    def record(self, stage: str, duration: float):
+        with self.lock:
+            self.stages[stage].append(duration)
+
+    @contextmanager
+    def measure(self, stage: str):
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - started_at)
+
+    def start_request(self):
+        """
+        Starts the time to first audio clock of the current task. Tasks it creates inherit the request.
+        """
+        _current_request.set({'started_at': time.perf_counter(), 'first_audio_at': None})
+
+    def mark_audio_sent(self):
+        request = _current_request.get()
+        if request is None or request['first_audio_at'] is not None:
+            return
+        request['first_audio_at'] = time.perf_counter()
+        with self.lock:
+            self.time_to_first_audio.append(request['first_audio_at'] - request['started_at'])
+
+    def finish_request(self):
+        request = _current_request.get()
+        if request is not None and request['first_audio_at'] is None:
+            with self.lock:
+                self.unanswered += 1
+        _current_request.set(None)
+
+    def wrap(self, owner, name: str, stage: str):
+        func = getattr(owner, name)
+
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            with self.measure(stage):
+                return func(*args, **kwargs)
+
+        setattr(owner, name, timed)
+
+    def wrap_first_item(self, owner, name: str, stage: str):
+        """
+        Records the time until a generator method yields its first item
+        """
+        func = getattr(owner, name)
+
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            started_at = time.perf_counter()
+            is_first = True
+            for item in func(*args, **kwargs):
+                if is_first:
+                    self.record(stage, time.perf_counter() - started_at)
+                    is_first = False
+                yield item
+
+        setattr(owner, name, timed)
+
+    def wrap_first_async_item(self, owner, name: str, stage: str):
+        """
+        Records the time until an async generator method yields its first item
+        """
+        func = getattr(owner, name)
+
+        @functools.wraps(func)
+        async def timed(*args, **kwargs):
+            started_at = time.perf_counter()
+            is_first = True
+            items = func(*args, **kwargs)
+            try:
+                async for item in items:
+                    if is_first:
+                        self.record(stage, time.perf_counter() - started_at)
+                        is_first = False
+                    yield item
+            finally:
+                await items.aclose()
+
+        setattr(owner, name, timed)
+
+    def summarize(self) -> dict:
+        with self.lock:
+            stages = {stage: list(durations) for stage, durations in self.stages.items()}
+            time_to_first_audio = list(self.time_to_first_audio)
+            unanswered = self.unanswered
+
+        summary = {
+            'requests': len(time_to_first_audio) + unanswered,
+            'unanswered': unanswered,
+            'time_to_first_audio': summarize_durations(time_to_first_audio, TTFA_PERCENTILES),
+            'stages': {stage: summarize_durations(durations, STAGE_PERCENTILES) for stage, durations in stages.items()},
+        }
+        return summary
+
+
+def summarize_durations(durations: list[float], percentiles=STAGE_PERCENTILES) -> dict:
+    if not durations:
+        return {'calls': 0}
+    summary = {'calls': len(durations), 'mean': float(np.mean(durations))}
+    for percentile in percentiles:
+        summary[f'p{percentile}'] = float(np.percentile(durations, percentile))
+    return summary
+
+
+def word_error_rate(reference: str, hypothesis: str) -> float:
+    """
+    Word-level Levenshtein distance between normalized texts divided by the reference length
+    """
+    reference_words = normalize_text(reference).split()
+    hypothesis_words = normalize_text(hypothesis).split()
+    if not reference_words:
+        return float(bool(hypothesis_words))
+
+    distances = list(range(len(hypothesis_words) + 1))
+    for reference_index, reference_word in enumerate(reference_words, start=1):
+        previous_diagonal, distances[0] = distances[0], reference_index
+        for hypothesis_index, hypothesis_word in enumerate(hypothesis_words, start=1):
+            substitution = previous_diagonal + (reference_word != hypothesis_word)
+            deletion = distances[hypothesis_index] + 1
+            insertion = distances[hypothesis_index - 1] + 1
+            previous_diagonal = distances[hypothesis_index]
+            distances[hypothesis_index] = min(substitution, deletion, insertion)
+    return distances[-1] / len(reference_words)
+
+
+def compare_with_baseline(results: dict, baseline: dict, max_regression: float) -> list[str]:
+    """
+    Compares time to first audio percentiles and stage medians of every scenario against the baseline.
+    Returns descriptions of metrics that got slower by more than max_regression (a fraction).
+    """
+    regressions = []
+    for scenario, summary in results.items():
+        baseline_summary = baseline.get(scenario)
+        if not baseline_summary:
+            print(f'{scenario}: no baseline')
+            continue
+        metrics = [
+            (f'ttfa {name}', summary['time_to_first_audio'].get(name), baseline_summary['time_to_first_audio'].get(name))
+            for name in (f'p{percentile}' for percentile in TTFA_PERCENTILES)
+        ]
+        for stage, stage_summary in summary['stages'].items():
+            baseline_stage = baseline_summary['stages'].get(stage, {})
+            metrics.append((f'{stage} p50', stage_summary.get('p50'), baseline_stage.get('p50')))
+
+        for metric, value, baseline_value in metrics:
+            if value is None or not baseline_value:
+                continue
+            change = value / baseline_value - 1
+            print(f'{scenario:>10} {metric:<20} {baseline_value:.3f}s -> {value:.3f}s ({change:+.1%})')
+            if change > max_regression:
+                regressions.append(f'{scenario} {metric} {change:+.1%}')
+    return regressions
+
+
+def load_baseline(baseline_path: str) -> dict:
+    with open(baseline_path, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+
+def save_baseline(baseline_path: str, results: dict):
+    with open(baseline_path, 'w', encoding='utf-8') as file:
+        json.dump(results, file, indent=2, sort_keys=True)
@@ -1,91 +1,318 @@
 from abc import ABC, abstractmethod
+import asyncio
+import os
+import time
+import uuid
 
 from os import path, makedirs, remove
+from shutil import rmtree
+from typing import TYPE_CHECKING
 
-from telegram import Voice
-from config import FS_ROOT_PATH
+from config import (
+    ARTIFACTS_DISK_LIMIT_MB,
+    ARTIFACTS_MAX_AGE,
+    ARTIFACTS_MEMORY_LIMIT_MB,
+    ARTIFACTS_SWEEP_INTERVAL,
+    FS_ROOT_PATH,
+    TELEGRAM_VOICE_IN_MEMORY,
+    TELEGRAM_VOICE_MEMORY_LIMIT_KB,
+)
+from src.pipeline.services import StageExecutor
+from src.tracing.services import metrics
+
+if TYPE_CHECKING:
+    from telegram import Voice
+
+
+class Artifact:
+    """
+    Bytes produced while serving a request. They stay in memory while the store's spool has room and
+    spill to a file in the scope directory otherwise, or as soon as a file path is asked for.
+    """
+
+    def __init__(self, store: 'BaseArtifactsIO', scope: 'ArtifactScope', name: str) -> None:
+        self.store = store
+        self.scope = scope
+        self.name = name
+        self.buffer = bytearray()
+        self.file_path: str | None = None
+        self.file = None
+
+    @property
+    def is_spilled(self) -> bool:
+        return self.file_path is not None
+
+    async def write(self, data: bytes):
+        if not self.is_spilled and self.store.reserve_memory(len(data)):
+            self.buffer += data
+            return
+        await self.spill()
+        await self.store.io.run(self._append_to_file, bytes(data))
+
+    async def read(self) -> bytes:
+        if not self.is_spilled:
+            return bytes(self.buffer)
+        return await self.store.io.run(self._read_file)
+
+    async def get_path(self) -> str:
+        """
+        Spills the artifact and returns its file path, for tools that only work with files.
+        The file may be rewritten by the caller, later reads see its content.
+        """
+        await self.spill()
+        await self.store.io.run(self._close_file)
+        return self.file_path  # type: ignore
+
+    async def spill(self):
+        if self.is_spilled:
+            return
+        directory = await self.scope.make_directory()
+        self.file_path = path.join(directory, self.name)
+        data, self.buffer = bytes(self.buffer), bytearray()
+        self.store.release_memory(len(data))
+        await self.store.io.run(self._append_to_file, data)
+        metrics.inc('artifacts_spilled_total', help='Artifacts moved from memory to disk')
+
+    async def delete(self):
+        self.store.release_memory(len(self.buffer))
+        self.buffer = bytearray()
+        if self.is_spilled:
+            await self.store.io.run(self._delete_file)
+
+    def _append_to_file(self, data: bytes):
+        if self.file is None:
+            self.file = open(self.file_path, 'ab')  # type: ignore
+        self.file.write(data)
+
+    def _read_file(self) -> bytes:
+        self._close_file()
+        with open(self.file_path, 'rb') as file:  # type: ignore
+            return file.read()
+
+    def _close_file(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def _delete_file(self):
+        self._close_file()
+        try:
+            remove(self.file_path)  # type: ignore
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f'Cannot delete {self.file_path}: {e}')
+
+
+class ArtifactScope:
+    """
+    Lifetime of the artifacts of one request or session. Leaving the scope (or closing it) deletes
+    every artifact and the scope directory, whatever happened while serving the request.
+    """
+
+    def __init__(self, store: 'BaseArtifactsIO', owner_id: str) -> None:
+        self.store = store
+        self.directory = path.join(store.fs_root, owner_id, uuid.uuid4().hex)
+        self.artifacts: list[Artifact] = []
+        self.is_directory_created = False
+
+    def create(self, name: str) -> Artifact:
+        artifact = Artifact(self.store, self, name)
+        self.artifacts.append(artifact)
+        return artifact
+
+    async def make_directory(self) -> str:
+        if not self.is_directory_created:
+            await self.store.io.run(self._make_directory)
+            self.is_directory_created = True
+        return self.directory
+
+    def _make_directory(self):
+        try:
+            makedirs(self.directory, exist_ok=True)
+        except FileNotFoundError:
+            # The sweeper may prune the empty owner directory while it is being created
+            makedirs(self.directory, exist_ok=True)
+
+    async def close(self):
+        artifacts, self.artifacts = self.artifacts, []
+        for artifact in artifacts:
+            await artifact.delete()
+        if self.is_directory_created:
+            await self.store.io.run(rmtree, self.directory, ignore_errors=True)
+            self.is_directory_created = False
+        self.store.forget_scope(self)
+
+    async def __aenter__(self) -> 'ArtifactScope':
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
 
 
 class BaseArtifactsIO(ABC):
-    def __init__(self, root_path: str = FS_ROOT_PATH) -> None:
+    """
+    Artifact store: request scoped artifacts kept in a RAM spool capped at memory_limit bytes for all
+    artifacts together, file I/O on a worker thread and a background sweeper that deletes files left
+    behind by crashed requests (older than max_age) and keeps the directory under disk_limit bytes.
+    """
+
+    _ARTIFACTS_DIR_NAME = 'requests'
+
+    def __init__(
+        self,
+        root_path: str = path.join(FS_ROOT_PATH, _ARTIFACTS_DIR_NAME),
+        memory_limit: int = ARTIFACTS_MEMORY_LIMIT_MB * 1024 * 1024,
+        disk_limit: int = ARTIFACTS_DISK_LIMIT_MB * 1024 * 1024,
+        max_age: float = ARTIFACTS_MAX_AGE,
+        sweep_interval: float = ARTIFACTS_SWEEP_INTERVAL,
+    ) -> None:
         self.fs_root = root_path
+        self.memory_limit = memory_limit
+        self.disk_limit = disk_limit
+        self.max_age = max_age
+        self.sweep_interval = sweep_interval
 
-    async def read_user_audio_file(self, user_id):
-        user_artifacts_path = self._make_user_artifacts_path(user_id)
-        await self._read_audio_file(user_artifacts_path)
+        self.io = StageExecutor('artifacts', max_workers=2)
+        self.memory_used = 0
+        self.disk_used = 0
+        self.scopes: set[ArtifactScope] = set()
+        self.sweeper: asyncio.Task | None = None
+        metrics.add_collector(self._collect_metrics)
 
-    async def write_user_audio_file(self, user_id: str, voice_message):
-        user_artifacts_path = self._make_user_artifacts_path(user_id)
-        if not path.exists(user_artifacts_path):
-            makedirs(user_artifacts_path)
-        return await self._write_audio_file(user_artifacts_path, voice_message)
+    def scope(self, owner_id: str) -> ArtifactScope:
+        scope = ArtifactScope(self, owner_id)
+        self.scopes.add(scope)
+        return scope
 
-    def make_user_artifact_file_path(self, user_id: str, filename: str) -> str:
-        user_artifacts_path = self._make_user_artifacts_path(user_id)
-        return path.join(user_artifacts_path, filename)
+    def forget_scope(self, scope: ArtifactScope):
+        self.scopes.discard(scope)
 
-    def delete_artifacts(self, user_id: str, filename_array):
-        for filename in filename_array:
-            file_path = self.make_user_artifact_file_path(user_id, filename)
-            if not path.exists(file_path):
-                continue
+    def reserve_memory(self, size: int) -> bool:
+        if self.memory_used + size > self.memory_limit:
+            return False
+        self.memory_used += size
+        return True
+
+    def release_memory(self, size: int):
+        self.memory_used = max(self.memory_used - size, 0)
+
+    async def write_user_audio_file(self, scope: ArtifactScope, voice_message) -> Artifact:
+        return await self._write_audio_file(scope, voice_message)
+
+    def start_sweeper(self):
+        if self.sweeper is None or self.sweeper.done():
+            self.sweeper = asyncio.create_task(self._sweep_periodically())
+
+    async def sweep(self) -> int:
+        return await self.io.run(self._sweep_files)
+
+    async def _sweep_periodically(self):
+        while True:
             try:
-                remove(file_path)
+                removed = await self.sweep()
+                if removed:
+                    print(f'Artifacts sweeper removed {removed} files, {self.disk_used} bytes left on disk')
             except Exception as e:
-                print(f'Cannot delete {filename}: {e}')
+                print(f'Artifacts sweeper failed: {e}')
+            await asyncio.sleep(self.sweep_interval)
 
-    def _make_user_artifacts_path(self, user_id) -> str:
-        return path.join(self.fs_root, user_id)
+    def _get_live_directories(self) -> set[str]:
+        # Scopes are opened on the event loop while the sweep runs on a worker thread,
+        # so the set is read right before deciding, not once per sweep
+        return {scope.directory for scope in tuple(self.scopes)}
 
-    @abstractmethod
-    async def _write_audio_file(self, artifacts_dir: str, voice_message):
-        pass
+    def _sweep_files(self) -> int:
+        """
+        Removes stale files outside live scopes, then the oldest ones while the disk limit is exceeded
+        """
+        if not path.exists(self.fs_root):
+            self.disk_used = 0
+            return 0
 
-    @abstractmethod
-    async def _read_audio_file(self, artifacts_dir: str):
-        pass
+        files = []
+        modified_directories = {}
+        for directory, _, filenames in os.walk(self.fs_root):
+            try:
+                modified_directories[directory] = os.stat(directory).st_mtime
+            except OSError:
+                continue
+            for filename in filenames:
+                file_path = path.join(directory, filename)
+                try:
+                    stat = os.stat(file_path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, file_path))
+
+        now = time.time()
+        disk_used = sum(size for _, size, _ in files)
+        removed = 0
+        live_directories = self._get_live_directories()
+        for modified_at, size, file_path in sorted(files):
+            if path.dirname(file_path) in live_directories:
+                continue
+            if now - modified_at < self.max_age and disk_used <= self.disk_limit:
+                continue
+            try:
+                remove(file_path)
+            except OSError as e:
+                print(f'Cannot delete {file_path}: {e}')
+                continue
+            disk_used -= size
+            removed += 1
 
+        kept_directories = {self.fs_root}
+        for live_directory in self._get_live_directories():
+            while live_directory.startswith(self.fs_root) and live_directory not in kept_directories:
+                kept_directories.add(live_directory)
+                live_directory = path.dirname(live_directory)
+        for directory, _, _ in os.walk(self.fs_root, topdown=False):
+            # Directories created during the sweep (by a scope opened after the live scopes were read) are not
+            # in the listing, and recently changed ones may be about to get a file, so only stale ones are pruned
+            if directory in kept_directories or now - modified_directories.get(directory, now) < self.max_age:
+                continue
+            try:
+                os.rmdir(directory)
+            except OSError:
+                pass
 
-class TelegramBotApiArtifactsIO(BaseArtifactsIO):
-    def __init__(self) -> None:
-        super().__init__()
+        self.disk_used = disk_used
+        if removed:
+            metrics.inc('artifacts_swept_total', removed, 'Orphaned or over-limit artifact files removed')
+        return removed
 
-    async def _write_audio_file(self, artifacts_dir: str, voice_message: Voice) -> str:
-        file = await voice_message.get_file()
-        file_name = f'{voice_message.file_unique_id}.ogg'
-        file_path = path.join(artifacts_dir, file_name)
-        await file.download_to_drive(file_path)
-        return file_path
+    def _collect_metrics(self):
+        yield 'artifacts_memory_bytes', 'gauge', 'Artifact bytes kept in memory', {}, self.memory_used
+        yield 'artifacts_disk_bytes', 'gauge', 'Artifact bytes on disk at the last sweep', {}, self.disk_used
+        yield 'artifacts_scopes', 'gauge', 'Open artifact scopes', {}, len(self.scopes)
 
-    async def _read_audio_file(self, artifacts_dir: str):
+    @abstractmethod
+    async def _write_audio_file(self, scope: ArtifactScope, voice_message) -> Artifact:
         pass
 
 
-class WebSocketsBotArtifactsIO(BaseArtifactsIO):
-    _WS_BOT_NAMESPACE = 'ws_bot'
+class TelegramBotApiArtifactsIO(BaseArtifactsIO):
+    """
+    Voice notes up to voice_memory_limit bytes are downloaded straight into the RAM spool,
+    bigger ones (or every one, with in-memory mode off) are downloaded to disk.
+    """
 
-    def __init__(self) -> None:
-        self.ws_bot_spec_file_name = 'ws_bot_spec_file.wav'
+    def __init__(
+        self,
+        voice_in_memory: bool = TELEGRAM_VOICE_IN_MEMORY,
+        voice_memory_limit: int = TELEGRAM_VOICE_MEMORY_LIMIT_KB * 1024,
+    ) -> None:
         super().__init__()
+        self.voice_in_memory = voice_in_memory
+        self.voice_memory_limit = voice_memory_limit
 
-    async def write_ws_audio_file(self, filename: str, input_webm_buffer: list, user_id: str = _WS_BOT_NAMESPACE):
-        return await self.write_user_audio_file(user_id, {'filename': filename, 'input_webm_buffer': input_webm_buffer})
-
-    async def _write_audio_file(self, artifacts_dir: str, voice_message) -> str:
-        file_path = path.join(artifacts_dir, voice_message['filename'])
-        with open(file_path, 'ab') as f:
-            for data in voice_message['input_webm_buffer']:
-                f.write(data)
-        return file_path
-
-    def get_spec_file(self, user_id: str = _WS_BOT_NAMESPACE):
-        user_artifacts_path = self._make_user_artifacts_path(user_id)
-        file_path = path.join(user_artifacts_path, self.ws_bot_spec_file_name)
-        return file_path
-
-    def make_ws_artifact_file_path(self, filename: str, user_id: str = _WS_BOT_NAMESPACE) -> str:
-        user_artifacts_path = self._make_user_artifacts_path(user_id)
-        return path.join(user_artifacts_path, filename)
+    async def _write_audio_file(self, scope: ArtifactScope, voice_message: 'Voice') -> Artifact:
+        file = await voice_message.get_file()
+        artifact = scope.create(f'{voice_message.file_unique_id}.ogg')
+        if self.voice_in_memory and (voice_message.file_size or 0) <= self.voice_memory_limit:
+            await artifact.write(await file.download_as_bytearray())
+        else:
+            await file.download_to_drive(await artifact.get_path())
+        return artifact
 
-    async def _read_audio_file(self, artifacts_dir: str):
-        pass
@@ -0,0 +1,65 @@
+from collections import deque
+
+
+class ConversationMemory:
+    """
+    Conversation history of one user or session, bounded by a token budget. History only grows at
+    the end, and once the budget is exceeded the oldest turns are folded into a summary (or dropped)
+    in one big step. The prompt prefix therefore stays identical between most turns, so the Ollama
+    server can reuse its KV cache for it.
+    """
+
+    _TOKEN_BUDGET = 2048
+    _COMPACTION_RATIO = 0.5
+    _CHARS_PER_TOKEN = 3
+
+    def __init__(self, system_prompt: str = '', token_budget: int = _TOKEN_BUDGET) -> None:
+        self.system_prompt = system_prompt
+        self.token_budget = token_budget
+        self.summary = ''
+        self.turns: deque[tuple[str, str]] = deque()
+        self.pending_turn: tuple[str, str] | None = None
+
+    @classmethod
+    def estimate_tokens(cls, text: str) -> int:
+        # Rough estimate for llama-like tokenizers on mixed Russian/English text
+        return len(text) // cls._CHARS_PER_TOKEN + 1
+
+    def count_tokens(self) -> int:
+        tokens = self.estimate_tokens(self.system_prompt) + self.estimate_tokens(self.summary)
+        for question, answer in self.turns:
+            tokens += self.estimate_tokens(question) + self.estimate_tokens(answer)
+        return tokens
+
+    def make_messages(self, question: str) -> list[tuple[str, str]]:
+        messages = []
+        if self.system_prompt:
+            messages.append(('system', self.system_prompt))
+        if self.summary:
+            messages.append(('system', f'Summary of the earlier conversation: {self.summary}'))
+        for previous_question, answer in self.turns:
+            messages.append(('human', previous_question))
+            messages.append(('ai', answer))
+        messages.append(('human', question))
+        return messages
+
+    def add_turn(self, question: str, answer: str):
+        self.turns.append((question, answer))
+
+    def is_compaction_needed(self) -> bool:
+        return self.count_tokens() > self.token_budget
+
+    def pop_old_turns(self, compaction_ratio: float = _COMPACTION_RATIO) -> list[tuple[str, str]]:
+        """
+        Removes the oldest turns until the history fits into compaction_ratio of the budget
+        and returns them for summarization
+        """
+        old_turns = []
+        while self.turns and self.count_tokens() > self.token_budget * compaction_ratio:
+            old_turns.append(self.turns.popleft())
+        return old_turns
+
+    def clear(self):
+        self.summary = ''
+        self.turns.clear()
+        self.pending_turn = None
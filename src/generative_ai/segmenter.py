@@ -0,0 +1,150 @@
+class SentenceSegmenter:
+    """
+    Incremental splitter of an LLM token stream into TTS segments. Only newly received text is scanned.
+    The first clause is flushed early to cut time to first audio, later sentences are merged into
+    bigger segments for TTS throughput. Abbreviations, initials, decimals and ellipses do not end
+    a sentence, and punctuation is kept for prosody.
+    """
+
+    _TERMINATORS = '.!?…'
+    _CLAUSE_TERMINATORS = ',;:—'
+    _CLOSING_MARKS = '"\'»)]'
+    _ABBREVIATIONS = {
+        'т.е', 'т.д', 'т.п', 'т.к', 'т.н', 'др', 'пр', 'см', 'напр', 'г', 'гг', 'в', 'вв', 'им', 'ул', 'д', 'стр',
+        'руб', 'коп', 'тыс', 'млн', 'млрд', 'e.g', 'i.e', 'etc', 'vs', 'mr', 'mrs', 'ms', 'dr', 'prof', 'st', 'jr',
+    }  # fmt: skip
+
+    _FIRST_CLAUSE_MIN_LENGTH = 20
+    _FIRST_SEGMENT_MAX_LENGTH = 80
+    _MIN_SEGMENT_LENGTH = 80
+    _MAX_SEGMENT_LENGTH = 180
+
+    def __init__(
+        self,
+        first_clause_min_length: int = _FIRST_CLAUSE_MIN_LENGTH,
+        first_segment_max_length: int = _FIRST_SEGMENT_MAX_LENGTH,
+        min_segment_length: int = _MIN_SEGMENT_LENGTH,
+        max_segment_length: int = _MAX_SEGMENT_LENGTH,
+    ) -> None:
+        self.first_clause_min_length = first_clause_min_length
+        self.first_segment_max_length = first_segment_max_length
+        self.min_segment_length = min_segment_length
+        self.max_segment_length = max_segment_length
+
+        self.buffer = ''
+        self.scan_position = 0
+        self.pending = ''
+        self.is_first_segment_sent = False
+
+    def feed(self, text: str) -> list[str]:
+        self.buffer += text
+        segments = []
+        while (sentence := self._extract_sentence()) is not None:
+            segments.extend(self._merge(sentence))
+        if not self.is_first_segment_sent:
+            segments.extend(self._extract_first_clause())
+        return segments
+
+    def flush(self) -> list[str]:
+        rest = self._join(self.pending, self.buffer.strip())
+        self.buffer = ''
+        self.scan_position = 0
+        self.pending = ''
+        return self._split_long(rest) if rest else []
+
+    def _extract_sentence(self) -> str | None:
+        buffer = self.buffer
+        position = self.scan_position
+        while position < len(buffer):
+            if buffer[position] not in self._TERMINATORS:
+                position += 1
+                continue
+
+            end = position
+            while end < len(buffer) and buffer[end] in self._TERMINATORS:
+                end += 1
+            while end < len(buffer) and buffer[end] in self._CLOSING_MARKS:
+                end += 1
+
+            next_word_start = end
+            while next_word_start < len(buffer) and buffer[next_word_start].isspace():
+                next_word_start += 1
+            if next_word_start == len(buffer):
+                # Can not decide before the next token arrives
+                self.scan_position = position
+                return None
+
+            if next_word_start > end and self._is_sentence_end(buffer, position, end, buffer[next_word_start]):
+                sentence = buffer[:end].strip()
+                self.buffer = buffer[next_word_start:]
+                self.scan_position = 0
+                return sentence
+            position = end
+
+        self.scan_position = position
+        return None
+
+    def _is_sentence_end(self, buffer: str, terminator_position: int, end: int, next_char: str) -> bool:
+        terminators = buffer[terminator_position:end]
+        if terminators.startswith('.') and not terminators.startswith('...'):
+            word_start = buffer.rfind(' ', 0, terminator_position) + 1
+            word = buffer[word_start:terminator_position].lower().strip('(«"\'')
+            if word in self._ABBREVIATIONS or (len(word) == 1 and word.isalpha()):
+                return False
+        # A lowercase continuation means the dot belongs to an abbreviation or an ellipsis mid-sentence
+        return not next_char.islower()
+
+    def _extract_first_clause(self) -> list[str]:
+        if self.pending:
+            segment, self.pending = self.pending, ''
+            self.is_first_segment_sent = True
+            return [segment]
+
+        for index in range(self.first_clause_min_length, len(self.buffer) - 1):
+            if self.buffer[index] in self._CLAUSE_TERMINATORS and self.buffer[index + 1].isspace():
+                return [self._cut_first_segment(index + 1)]
+
+        if len(self.buffer) >= self.first_segment_max_length:
+            cut_index = self.buffer.rfind(' ', 0, self.first_segment_max_length)
+            if cut_index > 0:
+                return [self._cut_first_segment(cut_index)]
+        return []
+
+    def _cut_first_segment(self, cut_index: int) -> str:
+        segment = self.buffer[:cut_index].strip()
+        self.buffer = self.buffer[cut_index:].lstrip()
+        self.scan_position = 0
+        self.is_first_segment_sent = True
+        return segment
+
+    def _merge(self, sentence: str) -> list[str]:
+        segments = []
+        if self.pending and len(self.pending) + len(sentence) + 1 > self.max_segment_length:
+            segments.append(self.pending)
+            self.pending = ''
+        self.pending = self._join(self.pending, sentence)
+
+        if not self.is_first_segment_sent or len(self.pending) >= self.min_segment_length:
+            self.is_first_segment_sent = True
+            segments.extend(self._split_long(self.pending))
+            self.pending = ''
+        return segments
+
+    def _split_long(self, segment: str) -> list[str]:
+        segments = []
+        while len(segment) > self.max_segment_length:
+            head = segment[: self.max_segment_length]
+            cut_index = max(head.rfind(mark + ' ') for mark in self._CLAUSE_TERMINATORS) + 1
+            if cut_index <= 0:
+                cut_index = head.rfind(' ')
+            if cut_index <= 0:
+                cut_index = self.max_segment_length
+            segments.append(segment[:cut_index].strip())
+            segment = segment[cut_index:].strip()
+        if segment:
+            segments.append(segment)
+        return segments
+
+    @staticmethod
+    def _join(left: str, right: str) -> str:
+        return f'{left} {right}' if left and right else left or right
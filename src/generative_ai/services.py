@@ -1,29 +1,191 @@
-import re
+from collections import OrderedDict, deque
+import time
+
 from langchain_ollama import ChatOllama
 
-from config import LLM_MODEL
+from config import LLM_CONTEXT_TOKEN_BUDGET, LLM_MEMORY_SUMMARIZE, LLM_MODEL, LLM_SYSTEM_PROMPT
+from src.generative_ai.memory import ConversationMemory
+from src.generative_ai.segmenter import SentenceSegmenter
+from src.tracing.services import metrics, tracer
 
 
 class LangChainService:
     _BASE_MODEL = LLM_MODEL
+    _DEFAULT_SESSION = 'default'
+    _MAX_SESSIONS = 1024
+    _TURN_METRICS_SIZE = 100
+    _SUMMARY_PROMPT = (
+        'Summarize the conversation below in a few sentences. '
+        'Keep facts about the user, decisions and open questions.'
+    )
 
-    def __init__(self, model_type: str = _BASE_MODEL):
+    def __init__(
+        self,
+        model_type: str = _BASE_MODEL,
+        segmenter_options: dict | None = None,
+        system_prompt: str = LLM_SYSTEM_PROMPT,
+        token_budget: int = LLM_CONTEXT_TOKEN_BUDGET,
+        summarize: bool = LLM_MEMORY_SUMMARIZE,
+    ):
         self.model = ChatOllama(model=model_type)
-        self.context = ''
-
-    def ask_model(self, question: str):
-        buffer = ''
-        sentence_end_pattern = re.compile(r'[.!?]')
-
-        for chunk in self.model.stream(f'{self.context}\n{question}'):
-            buffer += str(chunk.content)
-            while True:
-                match = sentence_end_pattern.search(buffer)
-                if match:
-                    end_idx = match.end()
-                    sentence = buffer[:end_idx].strip()
-                    sentence = sentence[0 : len(sentence) - 1]
-                    yield sentence
-                    buffer = buffer[end_idx:].strip()
-                else:
-                    break
+        self.segmenter_options = segmenter_options or {}
+        self.system_prompt = system_prompt
+        self.token_budget = token_budget
+        self.summarize = summarize
+
+        self.memories: OrderedDict[str, ConversationMemory] = OrderedDict()
+        self.turn_metrics: deque[dict] = deque(maxlen=self._TURN_METRICS_SIZE)
+
+    def warm_up(self):
+        """
+        Makes Ollama load the model into memory before the first real question
+        """
+        self.model.invoke([('human', 'Hi')])
+
+    def get_memory(self, session_id: str) -> ConversationMemory:
+        if session_id in self.memories:
+            self.memories.move_to_end(session_id)
+            return self.memories[session_id]
+        memory = ConversationMemory(self.system_prompt, self.token_budget)
+        self.memories[session_id] = memory
+        while len(self.memories) > self._MAX_SESSIONS:
+            self.memories.popitem(last=False)
+        return memory
+
+    def forget(self, session_id: str):
+        self.memories.pop(session_id, None)
+
+    def ask_model(self, question: str, session_id: str = _DEFAULT_SESSION, remember: bool = True):
+        memory = self.get_memory(session_id)
+        self.compact_memory(memory)
+        segmenter = SentenceSegmenter(**self.segmenter_options)
+        turn = self._start_turn(session_id, memory, question)
+        answer = []
+        try:
+            for chunk in self.model.stream(memory.make_messages(question)):
+                self._observe_chunk(turn, chunk)
+                answer.append(str(chunk.content))
+                yield from segmenter.feed(str(chunk.content))
+            yield from segmenter.flush()
+            turn['interrupted'] = False
+        finally:
+            self._finish_turn(turn, memory, question, ''.join(answer), remember)
+
+    async def aask_model(self, question: str, session_id: str = _DEFAULT_SESSION, remember: bool = True):
+        """
+        Async counterpart of ask_model built on astream. Cancelling the consuming task closes
+        the Ollama stream, so the server stops generating as well, and the partial answer is not remembered.
+        With remember=False a complete answer is only kept as pending until confirm_turn is called,
+        e.g. once the voice reply has been delivered, since the user can still interrupt it after generation.
+        """
+        memory = self.get_memory(session_id)
+        await self.acompact_memory(memory)
+        segmenter = SentenceSegmenter(**self.segmenter_options)
+        turn = self._start_turn(session_id, memory, question)
+        answer = []
+        stream = self.model.astream(memory.make_messages(question))
+        try:
+            async for chunk in stream:
+                self._observe_chunk(turn, chunk)
+                answer.append(str(chunk.content))
+                for segment in segmenter.feed(str(chunk.content)):
+                    yield segment
+            for segment in segmenter.flush():
+                yield segment
+            turn['interrupted'] = False
+        finally:
+            self._finish_turn(turn, memory, question, ''.join(answer), remember)
+            await stream.aclose()
+
+    def confirm_turn(self, session_id: str = _DEFAULT_SESSION):
+        """
+        Remembers the pending answer of the session, generated with remember=False
+        """
+        memory = self.memories.get(session_id)
+        if memory is not None and memory.pending_turn is not None:
+            memory.add_turn(*memory.pending_turn)
+            memory.pending_turn = None
+
+    def compact_memory(self, memory: ConversationMemory):
+        if not memory.is_compaction_needed():
+            return
+        old_turns = memory.pop_old_turns()
+        if self.summarize and old_turns:
+            memory.summary = str(self.model.invoke(self._make_summary_messages(memory, old_turns)).content)
+
+    async def acompact_memory(self, memory: ConversationMemory):
+        if not memory.is_compaction_needed():
+            return
+        old_turns = memory.pop_old_turns()
+        if self.summarize and old_turns:
+            summary = await self.model.ainvoke(self._make_summary_messages(memory, old_turns))
+            memory.summary = str(summary.content)
+
+    def get_turn_metrics(self) -> list[dict]:
+        return list(self.turn_metrics)
+
+    def _make_summary_messages(self, memory: ConversationMemory, old_turns: list[tuple[str, str]]):
+        conversation = [f'Summary so far: {memory.summary}'] if memory.summary else []
+        for question, answer in old_turns:
+            conversation.append(f'User: {question}\nAssistant: {answer}')
+        return [('system', self._SUMMARY_PROMPT), ('human', '\n'.join(conversation))]
+
+    @staticmethod
+    def _start_turn(session_id: str, memory: ConversationMemory, question: str) -> dict:
+        # An answer still pending at the next question was not confirmed as delivered, so it is dropped
+        memory.pending_turn = None
+        return {
+            'session_id': session_id,
+            'started_at': time.perf_counter(),
+            'estimated_prompt_tokens': memory.count_tokens() + memory.estimate_tokens(question),
+            'prompt_tokens': None,
+            'prefill_latency': None,
+            'time_to_first_token': None,
+            'completion_tokens': None,
+            'total_time': None,
+            'interrupted': True,
+        }
+
+    @staticmethod
+    def _observe_chunk(turn: dict, chunk):
+        if turn['time_to_first_token'] is None and chunk.content:
+            turn['time_to_first_token'] = time.perf_counter() - turn['started_at']
+        # Ollama reports prompt evaluation (prefill) stats in the metadata of the final chunk
+        metadata = chunk.response_metadata or {}
+        if 'prompt_eval_count' in metadata:
+            turn['prompt_tokens'] = metadata['prompt_eval_count']
+        if 'prompt_eval_duration' in metadata:
+            turn['prefill_latency'] = metadata['prompt_eval_duration'] / 1e9
+        if 'eval_count' in metadata:
+            turn['completion_tokens'] = metadata['eval_count']
+
+    def _finish_turn(self, turn: dict, memory: ConversationMemory, question: str, answer: str, remember: bool):
+        # A turn closed before the last sentence (barge-in, error) was never fully heard, so it is not remembered
+        if answer and not turn['interrupted']:
+            if remember:
+                memory.add_turn(question, answer)
+            else:
+                memory.pending_turn = (question, answer)
+        turn['total_time'] = time.perf_counter() - turn.pop('started_at')
+        self.turn_metrics.append(turn)
+        tracer.record_span(
+            'llm_turn',
+            turn['total_time'],
+            prompt_tokens=turn['prompt_tokens'],
+            completion_tokens=turn['completion_tokens'],
+            time_to_first_token=turn['time_to_first_token'],
+            prefill_latency=turn['prefill_latency'],
+            interrupted=turn['interrupted'],
+        )
+        if turn['time_to_first_token'] is not None:
+            metrics.observe('llm_time_to_first_token_seconds', turn['time_to_first_token'], 'LLM time to first token')
+        if turn['prompt_tokens'] is not None:
+            metrics.inc('llm_prompt_tokens_total', turn['prompt_tokens'], 'Prompt tokens evaluated by the LLM')
+        if turn['completion_tokens'] is not None:
+            metrics.inc('llm_completion_tokens_total', turn['completion_tokens'], 'Tokens generated by the LLM')
+        print(
+            f'LLM turn {turn["session_id"]}: prompt_tokens={turn["prompt_tokens"]} '
+            f'(estimated {turn["estimated_prompt_tokens"]}) prefill={turn["prefill_latency"]} '
+            f'first_token={turn["time_to_first_token"]} total={turn["total_time"]:.2f}s '
+            f'interrupted={turn["interrupted"]}'
+        )
@@ -0,0 +1,153 @@
+import asyncio
+import contextvars
+import functools
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable
+
+from config import INFERENCE_MAX_BATCH_DELAY, INFERENCE_MAX_BATCH_SIZE, INFERENCE_MAX_QUEUE_SIZE
+from src.tracing.services import SIZE_BUCKETS, metrics
+
+
+class InferenceQueueFull(Exception):
+    def __init__(self, name: str) -> None:
+        super().__init__(f'Inference queue {name} is full')
+
+
+class _Request:
+    def __init__(self, item=None, call: Callable | None = None) -> None:
+        self.item = item
+        self.call = call
+        self.future: Future = Future()
+        self.context = contextvars.copy_context()
+        self.enqueued_at = time.perf_counter()
+
+
+class InferenceScheduler:
+    """
+    Owns a model and serves requests of all chats and sessions on a single worker thread.
+    Batchable requests are grouped with dynamic micro-batching: the worker waits at most
+    max_batch_delay for up to max_batch_size requests and hands them to batch_fn in one call.
+    Plain calls (streaming, unbatchable methods) run alone on the same thread, in queue order.
+    Models without a batched path get no batch_fn and are only served plain calls.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        batch_fn: Callable[[list], list] | None = None,
+        max_batch_size: int = INFERENCE_MAX_BATCH_SIZE,
+        max_batch_delay: float = INFERENCE_MAX_BATCH_DELAY,
+        max_queue_size: int = INFERENCE_MAX_QUEUE_SIZE,
+    ) -> None:
+        self.name = name
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_batch_delay = max_batch_delay
+        self.requests: queue.Queue[_Request] = queue.Queue(maxsize=max_queue_size)
+        self.carried_request: _Request | None = None
+
+        metrics.add_collector(self._collect_metrics)
+        self.worker = threading.Thread(target=self._work, name=f'{name}_inference', daemon=True)
+        self.worker.start()
+
+    def submit_batched(self, item) -> Future:
+        if self.batch_fn is None:
+            raise TypeError(f'Inference scheduler {self.name} has no batch_fn')
+        return self._submit(_Request(item=item))
+
+    def submit(self, func: Callable, *args, **kwargs) -> Future:
+        return self._submit(_Request(call=functools.partial(func, *args, **kwargs)))
+
+    async def run_batched(self, item):
+        return await asyncio.wrap_future(self.submit_batched(item))
+
+    async def run(self, func: Callable, *args, **kwargs):
+        return await asyncio.wrap_future(self.submit(func, *args, **kwargs))
+
+    def _collect_metrics(self):
+        help = 'Requests waiting for a model'
+        yield 'inference_queue_depth', 'gauge', help, {'model': self.name}, self.requests.qsize()
+
+    def _submit(self, request: _Request) -> Future:
+        try:
+            self.requests.put_nowait(request)
+        except queue.Full:
+            metrics.inc('inference_rejected_total', help='Requests rejected by a full queue', model=self.name)
+            raise InferenceQueueFull(self.name)
+        return request.future
+
+    def _start(self, request: _Request) -> bool:
+        if not request.future.set_running_or_notify_cancel():
+            return False
+        wait = time.perf_counter() - request.enqueued_at
+        metrics.observe('queue_wait_seconds', wait, 'Time calls wait for a worker', queue=self.name)
+        return True
+
+    def _observe_busy(self, started_at: float):
+        metrics.inc('busy_seconds_total', time.perf_counter() - started_at, 'Worker busy time', worker=self.name)
+
+    def _next_request(self, timeout: float | None = None) -> _Request | None:
+        if self.carried_request is not None:
+            request, self.carried_request = self.carried_request, None
+            return request
+        try:
+            return self.requests.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def _collect_batch(self, first_request: _Request) -> list[_Request]:
+        batch = [first_request]
+        deadline = time.perf_counter() + self.max_batch_delay
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            request = self._next_request(timeout=remaining)
+            if request is None:
+                break
+            if request.call is not None:
+                self.carried_request = request
+                break
+            batch.append(request)
+        return batch
+
+    def _work(self):
+        while True:
+            request = self._next_request()
+            if request is None:
+                continue
+            if request.call is not None:
+                self._run_call(request)
+            else:
+                self._run_batch(self._collect_batch(request))
+
+    def _run_call(self, request: _Request):
+        if not self._start(request):
+            return
+        started_at = time.perf_counter()
+        try:
+            request.future.set_result(request.context.run(request.call))  # type: ignore
+        except Exception as error:
+            request.future.set_exception(error)
+        finally:
+            self._observe_busy(started_at)
+
+    def _run_batch(self, batch: list[_Request]):
+        batch = [request for request in batch if self._start(request)]
+        if not batch:
+            return
+        metrics.observe('inference_batch_size', len(batch), 'Requests per model call', SIZE_BUCKETS, model=self.name)
+        started_at = time.perf_counter()
+        try:
+            results = self.batch_fn([request.item for request in batch])  # type: ignore
+        except Exception as error:
+            for request in batch:
+                request.future.set_exception(error)
+            return
+        finally:
+            self._observe_busy(started_at)
+        for request, result in zip(batch, results):
+            request.future.set_result(result)
@@ -0,0 +1,158 @@
+from abc import ABC, abstractmethod
+from difflib import SequenceMatcher
+from threading import Lock
+import re
+import time
+
+import numpy as np
+
+from config import AUDIO_CAPTURE_KEY_WORD, KWS_ENGINE, KWS_WHISPER_MODEL, KWS_WINDOW_OVERLAP
+from src.audio_formatter.services import PCM_SAMPLE_RATE
+
+
+def normalize_text(text: str) -> str:
+    text = text.lower().replace('ё', 'е')
+    return re.sub(r'[^\w\s]', ' ', text)
+
+
+class BaseService(ABC):
+    _MATCH_RATIO = 0.75
+
+    def __init__(self, model, key_word: str, sample_rate: int):
+        self.kws = model
+        self.key_word = normalize_text(key_word).strip()
+        self.sample_rate = sample_rate
+
+        self.stats_lock = Lock()
+        self.calls = 0
+        self.audio_seconds = 0.0
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+
+    def detect(self, pcm: np.ndarray) -> bool:
+        """
+        Checks a mono float32 PCM window for the key word and records latency and CPU time of the check.
+        CPU time is process wide, so it is only accurate while nothing else runs inference.
+        """
+        started_at = time.perf_counter()
+        started_cpu_at = time.process_time()
+        is_detected = self.spot(pcm)
+        with self.stats_lock:
+            self.calls += 1
+            self.audio_seconds += len(pcm) / self.sample_rate
+            self.wall_seconds += time.perf_counter() - started_at
+            self.cpu_seconds += time.process_time() - started_cpu_at
+        return is_detected
+
+    @abstractmethod
+    def spot(self, pcm: np.ndarray) -> bool:
+        """
+        Abstract method to check whether the key word is pronounced in mono float32 PCM
+        """
+        pass
+
+    def is_key_word_in_text(self, text: str, match_ratio: float = _MATCH_RATIO) -> bool:
+        text = normalize_text(text)
+        if self.key_word in text:
+            return True
+        return any(SequenceMatcher(None, self.key_word, word).ratio() >= match_ratio for word in text.split())
+
+    def get_stats(self) -> dict:
+        with self.stats_lock:
+            return {
+                'calls': self.calls,
+                'audio_seconds': self.audio_seconds,
+                'average_latency': self.wall_seconds / self.calls if self.calls else 0.0,
+                'real_time_factor': self.wall_seconds / self.audio_seconds if self.audio_seconds else 0.0,
+                'cpu_per_audio_second': self.cpu_seconds / self.audio_seconds if self.audio_seconds else 0.0,
+            }
+
+
+class WhisperKeywordSpotter(BaseService):
+    """
+    Runs a tiny Whisper model used only for detection: a single greedy decode without timestamps or
+    temperature fallback, limited to a few tokens. The key word is not given as a prompt, that biases
+    the decoder toward it and wakes the assistant up on speech without the key word.
+    """
+
+    _BASE_MODEL_TYPE = KWS_WHISPER_MODEL
+    _SAMPLE_LEN = 24
+    _NO_SPEECH_THRESHOLD = 0.6
+
+    def __init__(
+        self,
+        model_type: str = _BASE_MODEL_TYPE,
+        key_word: str = AUDIO_CAPTURE_KEY_WORD,
+        language: str = 'ru',
+        sample_rate: int = PCM_SAMPLE_RATE,
+    ) -> None:
+        import whisper
+
+        self.whisper = whisper
+        self.decoding_options = whisper.DecodingOptions(
+            language=language,
+            sample_len=self._SAMPLE_LEN,
+            without_timestamps=True,
+            fp16=False,
+        )
+        super().__init__(whisper.load_model(model_type), key_word, sample_rate)
+
+    def warm_up(self):
+        self.spot(np.zeros(self.sample_rate, dtype=np.float32))
+
+    def spot(self, pcm: np.ndarray) -> bool:
+        audio = self.whisper.pad_or_trim(np.asarray(pcm, dtype=np.float32))
+        mel = self.whisper.log_mel_spectrogram(audio).to(self.kws.device)
+        result = self.whisper.decode(self.kws, mel, self.decoding_options)
+        if result.no_speech_prob > self._NO_SPEECH_THRESHOLD:
+            return False
+        return self.is_key_word_in_text(result.text)
+
+
+class TranscriptKeywordSpotter(BaseService):
+    """
+    Reference engine: full transcription with the main STT service, then a text match. Transcription goes
+    through the STT inference scheduler, so the shared model is only ever used by its own worker.
+    """
+
+    def __init__(
+        self,
+        stt_scheduler,
+        key_word: str = AUDIO_CAPTURE_KEY_WORD,
+        language: str = 'ru',
+        sample_rate: int = PCM_SAMPLE_RATE,
+    ) -> None:
+        self.language = language
+        super().__init__(stt_scheduler, key_word, sample_rate)
+
+    def spot(self, pcm: np.ndarray) -> bool:
+        analysis = self.kws.submit_batched((np.asarray(pcm, dtype=np.float32), self.language)).result()
+        return self.is_key_word_in_text(analysis['text'])
+
+
+class OverlappingWindows:
+    """
+    Prepends the tail of the previous window to every new one, so a key word straddling the boundary
+    of two fixed windows is still seen whole.
+    """
+
+    def __init__(self, overlap: float = KWS_WINDOW_OVERLAP, sample_rate: int = PCM_SAMPLE_RATE) -> None:
+        self.overlap_samples = int(overlap * sample_rate)
+        self.tail = np.zeros(0, dtype=np.float32)
+
+    def push(self, pcm: np.ndarray) -> np.ndarray:
+        window = np.concatenate((self.tail, pcm)) if len(self.tail) else pcm
+        if self.overlap_samples:
+            self.tail = np.array(window[max(len(window) - self.overlap_samples, 0) :], dtype=np.float32)
+        return window
+
+    def reset(self):
+        self.tail = np.zeros(0, dtype=np.float32)
+
+
+def make_keyword_spotter(stt_scheduler=None, engine: str = KWS_ENGINE) -> BaseService:
+    if engine == 'whisper_tiny':
+        return WhisperKeywordSpotter()
+    if engine == 'transcript':
+        return TranscriptKeywordSpotter(stt_scheduler)
+    raise ValueError(f'Unknown keyword spotting engine {engine}')
@@ -0,0 +1,51 @@
+import os
+import random
+from typing import Callable
+
+from config import READINESS_PHRASES_PATH
+from src.audio_formatter.services import PCM_FORMAT
+
+
+class PhrasesRegistry:
+    """
+    Catalogue of prerecorded phrases, loaded once at startup and kept in memory already encoded
+    in every wire format the bots send. Adding a phrase only takes dropping a file into the directory.
+    """
+
+    _PHRASE_EXTENSIONS = ('.wav', '.ogg', '.webm')
+    _SAMPLE_RATE = 24000
+
+    def __init__(
+        self,
+        formatter,
+        phrases_path: str = READINESS_PHRASES_PATH,
+        frame_builders: dict[str, Callable[[dict], str | list]] | None = None,
+        sample_rate: int = _SAMPLE_RATE,
+    ) -> None:
+        self.formatter = formatter
+        self.phrases_path = phrases_path
+        self.sample_rate = sample_rate
+        self.frame_builders = frame_builders or {}
+        self.phrases = []
+        self.load()
+
+    def load(self):
+        phrases = []
+        for filename in sorted(os.listdir(self.phrases_path)):
+            if not filename.endswith(self._PHRASE_EXTENSIONS):
+                continue
+            audio = self.formatter.read_audio_from_file(os.path.join(self.phrases_path, filename))
+            phrase = {
+                'name': filename,
+                'wav': self.formatter.write_audio_into_buffer(audio, 'wav'),
+                'ogg': self.formatter.write_audio_into_buffer(audio, 'ogg'),
+                'pcm': self.formatter.write_audio_into_buffer(audio, PCM_FORMAT, self.sample_rate),
+                'sample_rate': self.sample_rate,
+            }
+            phrase['frames'] = {name: build_frame(phrase) for name, build_frame in self.frame_builders.items()}
+            phrases.append(phrase)
+        self.phrases = phrases
+        print(f'Loaded {len(self.phrases)} phrases from {self.phrases_path}')
+
+    def choice(self) -> dict:
+        return random.choice(self.phrases)
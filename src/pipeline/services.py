@@ -0,0 +1,251 @@
+import asyncio
+import contextvars
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterable, Awaitable, Callable, Iterable
+
+from src.tracing.services import metrics, tracer
+
+_STOP = object()
+
+
+class StageExecutor:
+    """
+    Runs blocking calls of a single pipeline stage (model inference, ffmpeg, ...) off the event loop.
+    Calls keep the caller's trace context and report their queue wait and busy time.
+    """
+
+    def __init__(self, name: str, max_workers: int = 1) -> None:
+        self.name = name
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f'{name}_stage')
+
+    async def run(self, func: Callable, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        submitted_at = time.perf_counter()
+
+        def call():
+            started_at = time.perf_counter()
+            wait = started_at - submitted_at
+            metrics.observe('queue_wait_seconds', wait, 'Time calls wait for a worker', queue=self.name)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                busy = time.perf_counter() - started_at
+                metrics.inc('busy_seconds_total', busy, 'Worker busy time', worker=self.name)
+
+        return await loop.run_in_executor(self.executor, context.run, call)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class VoiceReplyPipeline:
+    """
+    Staged voice reply: LLM sentences -> TTS -> encoding -> sending.
+    Stages run concurrently and are connected by bounded queues, so sentence N+1 is synthesized while
+    sentence N is being sent. Every stage handles its items in FIFO order, so reply order is preserved.
+    """
+
+    _QUEUE_SIZE = 2
+
+    def __init__(
+        self,
+        tts_stage: StageExecutor,
+        encoder_stage: StageExecutor,
+        llm_stage: StageExecutor | None = None,
+        queue_size: int = _QUEUE_SIZE,
+    ) -> None:
+        self.tts_stage = tts_stage
+        self.encoder_stage = encoder_stage
+        self.llm_stage = llm_stage
+        self.queue_size = queue_size
+
+    async def run(
+        self,
+        sentences: Iterable[str] | AsyncIterable[str],
+        synthesize: Callable,
+        encode: Callable,
+        send: Callable[..., Awaitable],
+        stream_synthesis: bool = False,
+    ) -> dict:
+        """
+        Sentences come from an async iterator, or from a blocking iterator pulled on the LLM stage,
+        which the pipeline then needs.
+        With stream_synthesis synthesize returns an iterator of audio chunks for a sentence. It is drained
+        in a single call on the TTS stage and every chunk is passed to encode and send as soon as it is produced.
+        Coroutine functions (e.g. batched inference schedulers) are awaited directly instead of being
+        dispatched to their stage.
+        Cancelling run cancels every stage: the sentence stream is closed and queued model calls are dropped.
+        """
+        if self.llm_stage is None and not isinstance(sentences, AsyncIterable):
+            raise TypeError('Blocking sentence iterators are pulled on the LLM stage, which is not set')
+        stats = {'sentences': 0, 'deliveries': 0, 'time_to_first_reply': None, 'total_time': None}
+        started_at = time.perf_counter()
+
+        text_queue = asyncio.Queue(self.queue_size)
+        audio_queue = asyncio.Queue(self.queue_size)
+        encoded_queue = asyncio.Queue(self.queue_size)
+
+        async def put_sentence(sentence: str):
+            if sentence:
+                stats['sentences'] += 1
+                await text_queue.put(sentence)
+
+        async def generate():
+            if isinstance(sentences, AsyncIterable):
+                try:
+                    async for sentence in sentences:
+                        await put_sentence(sentence)
+                finally:
+                    if hasattr(sentences, 'aclose'):
+                        await sentences.aclose()  # type: ignore
+            else:
+                iterator = iter(sentences)
+                while (sentence := await self.llm_stage.run(next, iterator, _STOP)) is not _STOP:  # type: ignore
+                    await put_sentence(sentence)
+            await text_queue.put(_STOP)
+
+        async def call(stage: StageExecutor, func: Callable, item):
+            if asyncio.iscoroutinefunction(func):
+                return await func(item)
+            return await stage.run(func, item)
+
+        async def transform(source: asyncio.Queue, target: asyncio.Queue, stage: StageExecutor, func: Callable):
+            while (item := await source.get()) is not _STOP:
+                await target.put(await call(stage, func, item))
+            await target.put(_STOP)
+
+        async def transform_stream(source: asyncio.Queue, target: asyncio.Queue, stage, func: Callable):
+            loop = asyncio.get_running_loop()
+            while (item := await source.get()) is not _STOP:
+                chunks: asyncio.Queue = asyncio.Queue()
+                stopped = threading.Event()
+
+                def drain(item=item, chunks=chunks, stopped=stopped):
+                    # The whole sentence is generated in one exclusive worker call: the model keeps per-call
+                    # state between chunks, so streams of other sessions must not run in between
+                    generator = func(item)
+                    try:
+                        for chunk in generator:
+                            if stopped.is_set():
+                                break
+                            loop.call_soon_threadsafe(chunks.put_nowait, chunk)
+                    finally:
+                        generator.close()
+
+                drained = asyncio.ensure_future(stage.run(drain))
+                # Also stops the consumer when the call fails before drain starts (e.g. a full inference queue),
+                # the failure is then raised by awaiting drained
+                drained.add_done_callback(lambda _, chunks=chunks: chunks.put_nowait(_STOP))
+                try:
+                    while (chunk := await chunks.get()) is not _STOP:
+                        await target.put(chunk)
+                    await drained
+                finally:
+                    stopped.set()
+                    drained.cancel()
+            await target.put(_STOP)
+
+        async def deliver():
+            while (item := await encoded_queue.get()) is not _STOP:
+                with tracer.span('send'):
+                    await send(item)
+                stats['deliveries'] += 1
+                if stats['time_to_first_reply'] is None:
+                    stats['time_to_first_reply'] = time.perf_counter() - started_at
+                    metrics.observe(
+                        'time_to_first_reply_seconds',
+                        stats['time_to_first_reply'],
+                        'Time from the question to the first audio sent back',
+                    )
+
+        synthesis = transform_stream if stream_synthesis else transform
+        tasks = [
+            asyncio.create_task(generate()),
+            asyncio.create_task(synthesis(text_queue, audio_queue, self.tts_stage, synthesize)),
+            asyncio.create_task(transform(audio_queue, encoded_queue, self.encoder_stage, encode)),
+            asyncio.create_task(deliver()),
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        stats['total_time'] = time.perf_counter() - started_at
+        return stats
+
+
+class FairScheduler:
+    """
+    Shares one model worker between many sessions. Pending calls are queued per session and served
+    round-robin, so a single busy session cannot starve the others.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.stage = StageExecutor(name)
+        self.pending: OrderedDict[str, deque] = OrderedDict()
+        self.wakeup: asyncio.Event | None = None
+        self.worker: asyncio.Task | None = None
+
+    async def run(self, session_id: str, func: Callable, *args, **kwargs):
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        self.pending.setdefault(session_id, deque()).append((future, func, args, kwargs))
+        self.wakeup.set()  # type: ignore
+        return await future
+
+    def for_session(self, session_id: str) -> 'SessionStage':
+        return SessionStage(self, session_id)
+
+    def forget(self, session_id: str):
+        for future, *_ in self.pending.pop(session_id, ()):
+            future.cancel()
+
+    def _ensure_worker(self):
+        if self.worker is None or self.worker.done():
+            self.wakeup = asyncio.Event()
+            self.worker = asyncio.create_task(self._work())
+
+    def _next_call(self):
+        session_id, calls = next(iter(self.pending.items()))
+        call = calls.popleft()
+        if calls:
+            self.pending.move_to_end(session_id)
+        else:
+            del self.pending[session_id]
+        return call
+
+    async def _work(self):
+        while True:
+            if not self.pending:
+                self.wakeup.clear()  # type: ignore
+                await self.wakeup.wait()  # type: ignore
+                continue
+            future, func, args, kwargs = self._next_call()
+            if future.done():
+                continue
+            try:
+                result = await self.stage.run(func, *args, **kwargs)
+            except Exception as error:
+                if not future.done():
+                    future.set_exception(error)
+            else:
+                if not future.done():
+                    future.set_result(result)
+
+
+class SessionStage:
+    """
+    Stage facade bound to one session of a FairScheduler, usable wherever a StageExecutor is expected
+    """
+
+    def __init__(self, scheduler: FairScheduler, session_id: str) -> None:
+        self.scheduler = scheduler
+        self.session_id = session_id
+
+    async def run(self, func: Callable, *args, **kwargs):
+        return await self.scheduler.run(self.session_id, func, *args, **kwargs)
@@ -0,0 +1,73 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable
+
+
+class ModelRegistry:
+    """
+    Builds services on first use, or all of them at once in parallel threads. Every service is warmed up
+    with one inference (its warm_up method, when it has one) before it is handed out.
+    """
+
+    def __init__(self) -> None:
+        self.factories: OrderedDict[str, Callable] = OrderedDict()
+        self.services: dict[str, Future] = {}
+        self.startup_times: dict[str, dict] = {}
+        self.lock = threading.Lock()
+
+    def register(self, name: str, factory: Callable):
+        self.factories[name] = factory
+
+    def get(self, name: str):
+        """
+        Returns the service, loading it in the calling thread if nobody has started yet,
+        otherwise waiting for the thread that is loading it.
+        """
+        with self.lock:
+            future = self.services.get(name)
+            is_owner = future is None
+            if is_owner:
+                future = self.services[name] = Future()
+        if is_owner:
+            self._load(name, future)  # type: ignore
+        return future.result()  # type: ignore
+
+    def load_all(self) -> dict:
+        """
+        Loads every registered service in its own thread and blocks until all are ready.
+        A service may get another one from its factory, it simply waits for that one.
+        """
+        started_at = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(len(self.factories), 1), thread_name_prefix='registry') as executor:
+            for future in [executor.submit(self.get, name) for name in self.factories]:
+                future.result()
+        self.report(time.perf_counter() - started_at)
+        return self.get_startup_times()
+
+    def get_startup_times(self) -> dict:
+        with self.lock:
+            return {name: dict(times) for name, times in self.startup_times.items()}
+
+    def report(self, total_time: float):
+        for name, times in self.get_startup_times().items():
+            print(f'Loaded {name} in {times["load"]:.2f}s, warm-up {times["warm_up"]:.2f}s')
+        print(f'Startup finished in {total_time:.2f}s')
+
+    def _load(self, name: str, future: Future):
+        try:
+            started_at = time.perf_counter()
+            service = self.factories[name]()
+            loaded_at = time.perf_counter()
+            if hasattr(service, 'warm_up'):
+                service.warm_up()
+            with self.lock:
+                self.startup_times[name] = {
+                    'load': loaded_at - started_at,
+                    'warm_up': time.perf_counter() - loaded_at,
+                }
+        except Exception as error:
+            future.set_exception(error)
+        else:
+            future.set_result(service)
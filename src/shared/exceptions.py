@@ -1,3 +1,13 @@
 class DoNotImplementedException(Exception):
     def __init__(self):
         super().__init__('Method do not implemented')
+
+
+class UnsupportedAudioFormatException(Exception):
+    def __init__(self, audio_format: str):
+        super().__init__(f'Audio format {audio_format} is not supported')
+
+
+class InvalidAudioException(Exception):
+    def __init__(self, reason: str):
+        super().__init__(f'Invalid audio: {reason}')
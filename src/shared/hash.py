@@ -5,3 +5,9 @@ def md5_hash(input_string: str) -> str:
     md5 = hashlib.md5()
     md5.update(input_string.encode('utf-8'))
     return md5.hexdigest()
+
+
+def md5_bytes_hash(input_bytes: bytes) -> str:
+    md5 = hashlib.md5()
+    md5.update(input_bytes)
+    return md5.hexdigest()
@@ -1,45 +1,257 @@
 from abc import ABC, abstractmethod
+from collections import OrderedDict
+from threading import Lock
+from typing import Union
+import os
+
+import numpy as np
+
+from config import STT_CPU_THREADS, STT_COMPUTE_TYPE, STT_ENGINE, STT_WHISPER_MODEL
+from src.audio_formatter.resampling import resample_pcm
+from src.shared.exceptions import InvalidAudioException
+from src.shared.hash import md5_bytes_hash
+from src.tracing.services import metrics, tracer
+
+# A wav file path, a PCM array or any buffer-protocol object (bytes, memoryview, SharedMemory.buf) of float32 samples
+AudioInput = Union[str, np.ndarray, bytes, bytearray, memoryview]
+
+SAMPLE_RATE = 16000
 
 
 class BaseService(ABC):
-    def __init__(self, model):
+    _CACHE_SIZE = 32
+
+    def __init__(self, model, cache_size: int = _CACHE_SIZE):
         self.s2t = model
 
+        self.cache_size = cache_size
+        self.cache: OrderedDict[str, dict] = OrderedDict()
+        self.cache_lock = Lock()
+
     @abstractmethod
-    def transcribe(self, path_to_wav_file: str):
+    def use_model(self, audio: str | np.ndarray, language=None) -> dict:
         """
-        Abstract method to process audio files (in wav format) to text
+        Abstract method to process audio (a wav file path or 16 kHz mono float32 PCM) to a Whisper-like
+        result with text, segments (each with its no_speech_prob) and language
         """
         pass
 
+    @staticmethod
+    def prepare_audio(audio: AudioInput, sample_rate: int = SAMPLE_RATE) -> str | np.ndarray:
+        """
+        Brings PCM to the 16 kHz mono float32 array the models decode without spawning ffmpeg.
+        Buffers are viewed as float32 samples without copying, file paths are passed through.
+        """
+        if isinstance(audio, str):
+            return audio
+        if not isinstance(audio, np.ndarray):
+            try:
+                audio = np.frombuffer(audio, dtype=np.float32)
+            except (TypeError, ValueError) as error:
+                raise InvalidAudioException(str(error))
 
-class WhisperService(BaseService):
-    _BASE_MODEL_TYPE = 'base'
+        if audio.ndim == 2 and 1 in audio.shape:
+            audio = audio.reshape(-1)
+        if audio.ndim != 1:
+            raise InvalidAudioException(f'expected mono PCM, got shape {audio.shape}')
+        if audio.dtype == np.int16:
+            audio = audio.astype(np.float32) / 32768.0
+        elif audio.dtype != np.float32:
+            audio = audio.astype(np.float32)
+        if not np.isfinite(audio).all():
+            raise InvalidAudioException('PCM contains NaN or infinite samples')
 
-    def __init__(self, model_type: str = _BASE_MODEL_TYPE) -> None:
-        import whisper
+        return resample_pcm(audio, sample_rate, SAMPLE_RATE)
 
-        model = whisper.load_model(model_type)
-        super().__init__(model)
+    def analyze(self, audio: AudioInput, language=None, sample_rate: int = SAMPLE_RATE) -> dict:
+        """
+        Decodes audio once and returns its text, segments and mean no-speech probability.
+        Results are kept in a small LRU keyed by the audio content hash.
+        """
+        audio = self.prepare_audio(audio, sample_rate)
+        with tracer.span('stt') as span:
+            cache_key = self.make_cache_key(audio, language)
+            analysis = self.get_cached(cache_key)
+            span['cache'] = 'hit' if analysis is not None else 'miss'
+            if analysis is not None:
+                return analysis
+
+            result = self.use_model(audio, language=language)
+            analysis = {
+                'text': result['text'],
+                'segments': result['segments'],
+                'language': result.get('language'),
+                'no_speech_prob': self.calculate_no_speech_prob(result['segments']),
+            }
+            self.put_cached(cache_key, analysis)
+            return analysis
+
+    def analyze_batch(self, requests: list[tuple[AudioInput, str | None]]) -> list[dict]:
+        """
+        Analyzes several (audio, language) requests in one dispatch, returning results in the same order.
+        Services without a batched model path analyze them one by one.
+        """
+        return [self.analyze(audio, language=language) for audio, language in requests]
 
-    def use_model(self, path_to_wav_file: str, language=None):
-        return self.s2t.transcribe(path_to_wav_file, language=language)
+    def get_cached(self, cache_key: str) -> dict | None:
+        with self.cache_lock:
+            if cache_key not in self.cache:
+                metrics.inc('cache_requests_total', help='Cache lookups by result', cache='stt', result='miss')
+                return None
+            self.cache.move_to_end(cache_key)
+            metrics.inc('cache_requests_total', help='Cache lookups by result', cache='stt', result='hit')
+            return self.cache[cache_key]
 
-    def transcribe(self, path_to_wav_file: str, language=None) -> str:
-        result = self.use_model(path_to_wav_file, language=language)
-        return result['text']
+    def put_cached(self, cache_key: str, analysis: dict):
+        with self.cache_lock:
+            self.cache[cache_key] = analysis
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
 
-    def get_no_speech_prob(self, path_to_wav_file: str, language=None) -> float:
-        result = self.use_model(path_to_wav_file, language=language)
-        segments = result['segments']
+    def transcribe(self, audio: AudioInput, language=None, sample_rate: int = SAMPLE_RATE) -> str:
+        return self.analyze(audio, language=language, sample_rate=sample_rate)['text']
 
+    def get_no_speech_prob(self, audio: AudioInput, language=None, sample_rate: int = SAMPLE_RATE) -> float:
+        return self.analyze(audio, language=language, sample_rate=sample_rate)['no_speech_prob']
+
+    @staticmethod
+    def calculate_no_speech_prob(segments) -> float:
         if not segments:
             return 0
-        if len(segments) == 0:
-            return 0
 
         no_speech_prob_sum = 0
         for segment in segments:
             no_speech_prob_sum += segment['no_speech_prob']
 
         return no_speech_prob_sum / len(segments)
+
+    @staticmethod
+    def make_cache_key(audio: str | np.ndarray, language=None) -> str:
+        if isinstance(audio, str):
+            with open(audio, 'rb') as file:
+                audio_hash = md5_bytes_hash(file.read())
+        else:
+            audio_hash = md5_bytes_hash(memoryview(np.ascontiguousarray(audio)).cast('B'))
+        return f'{audio_hash}:{language}'
+
+
+class WhisperService(BaseService):
+    _BASE_MODEL_TYPE = STT_WHISPER_MODEL
+    _WARM_UP_SAMPLES = 16000
+
+    def __init__(self, model_type: str = _BASE_MODEL_TYPE, cache_size: int = BaseService._CACHE_SIZE) -> None:
+        import whisper
+
+        model = whisper.load_model(model_type)
+        super().__init__(model, cache_size)
+
+    def use_model(self, audio: str | np.ndarray, language=None) -> dict:
+        return self.s2t.transcribe(audio, language=language)
+
+    def warm_up(self):
+        self.use_model(np.zeros(self._WARM_UP_SAMPLES, dtype=np.float32), language='en')
+
+    def analyze_batch(self, requests: list[tuple[AudioInput, str | None]]) -> list[dict]:
+        """
+        Analyzes several (audio, language) requests at once. Short PCM clips sharing a language
+        are padded to one 30 second window each and decoded in a single batched Whisper pass;
+        file paths and longer clips fall back to the sequential analyze. PCM must already be at 16 kHz.
+        """
+        import torch
+        import whisper
+
+        analyses: list[dict | None] = [None] * len(requests)
+        batches: dict[str | None, list[tuple[int, np.ndarray, str]]] = {}
+        for index, (audio, language) in enumerate(requests):
+            audio = self.prepare_audio(audio)
+            cache_key = self.make_cache_key(audio, language)
+            analyses[index] = self.get_cached(cache_key)
+            if analyses[index] is not None:
+                continue
+            if isinstance(audio, str) or len(audio) > whisper.audio.N_SAMPLES:
+                analyses[index] = self.analyze(audio, language=language)
+                continue
+            batches.setdefault(language, []).append((index, audio, cache_key))
+
+        for language, batch in batches.items():
+            with tracer.span('stt_batch', batch_size=len(batch)):
+                mel = torch.stack([
+                    whisper.log_mel_spectrogram(whisper.pad_or_trim(audio), self.s2t.dims.n_mels)
+                    for _, audio, _ in batch
+                ]).to(self.s2t.device)
+                options = whisper.DecodingOptions(language=language, without_timestamps=True, fp16=False)
+                results = whisper.decode(self.s2t, mel, options)
+            for (index, audio, cache_key), result in zip(batch, results):
+                segment = {
+                    'start': 0.0,
+                    'end': len(audio) / whisper.audio.SAMPLE_RATE,
+                    'text': result.text,
+                    'avg_logprob': result.avg_logprob,
+                    'no_speech_prob': result.no_speech_prob,
+                }
+                analysis = {
+                    'text': result.text,
+                    'segments': [segment],
+                    'language': result.language,
+                    'no_speech_prob': result.no_speech_prob,
+                }
+                self.put_cached(cache_key, analysis)
+                analyses[index] = analysis
+        return analyses  # type: ignore
+
+
+class FasterWhisperService(BaseService):
+    """
+    Whisper on CTranslate2 (faster-whisper): int8 quantized weights and multi-threaded CPU kernels.
+    Decodes greedily like openai-whisper does by default, so transcripts of both services are comparable.
+    """
+
+    _BASE_MODEL_TYPE = STT_WHISPER_MODEL
+    _COMPUTE_TYPE = STT_COMPUTE_TYPE
+    _CPU_THREADS = STT_CPU_THREADS
+    _BEAM_SIZE = 1
+    _WARM_UP_SAMPLES = 16000
+
+    def __init__(
+        self,
+        model_type: str = _BASE_MODEL_TYPE,
+        compute_type: str = _COMPUTE_TYPE,
+        cpu_threads: int = _CPU_THREADS,
+        cache_size: int = BaseService._CACHE_SIZE,
+    ) -> None:
+        from faster_whisper import WhisperModel
+
+        cpu_threads = cpu_threads or os.cpu_count() or 1
+        print(f'Apply cpu device with {cpu_threads} threads and {compute_type} weights for faster-whisper')
+        model = WhisperModel(model_type, device='cpu', compute_type=compute_type, cpu_threads=cpu_threads)
+        super().__init__(model, cache_size)
+
+    def use_model(self, audio: str | np.ndarray, language=None) -> dict:
+        segments, info = self.s2t.transcribe(audio, language=language, beam_size=self._BEAM_SIZE)
+        # Segments are decoded lazily while the generator is consumed
+        segments = [
+            {
+                'start': segment.start,
+                'end': segment.end,
+                'text': segment.text,
+                'avg_logprob': segment.avg_logprob,
+                'no_speech_prob': segment.no_speech_prob,
+            }
+            for segment in segments
+        ]
+        return {
+            'text': ''.join(segment['text'] for segment in segments),
+            'segments': segments,
+            'language': info.language,
+        }
+
+    def warm_up(self):
+        self.use_model(np.zeros(self._WARM_UP_SAMPLES, dtype=np.float32), language='en')
+
+
+def make_speech_to_text(engine: str = STT_ENGINE) -> BaseService:
+    if engine == 'whisper':
+        return WhisperService()
+    if engine == 'faster_whisper':
+        return FasterWhisperService()
+    raise ValueError(f'Unknown speech to text engine {engine}')
@@ -0,0 +1,148 @@
+from collections import OrderedDict
+from threading import Lock
+import json
+import os
+
+import numpy as np
+
+from config import FS_ROOT_PATH, TTS_CACHE_DISK_LIMIT_MB, TTS_CACHE_MEMORY_ITEMS
+from src.shared.hash import md5_hash
+from src.tracing.services import metrics
+
+
+class SynthesisCache:
+    """
+    Content-addressed cache of synthesized sentences with a memory tier and a size-bounded disk tier.
+    Both tiers evict least recently used entries; disk recency survives restarts through file mtimes.
+    """
+
+    _CACHE_DIR_NAME = 'tts_cache'
+    _FILE_EXTENSION = '.npy'
+
+    def __init__(
+        self,
+        cache_path: str = os.path.join(FS_ROOT_PATH, _CACHE_DIR_NAME),
+        memory_items: int = TTS_CACHE_MEMORY_ITEMS,
+        disk_size_limit: int = TTS_CACHE_DISK_LIMIT_MB * 1024 * 1024,
+    ) -> None:
+        self.cache_path = cache_path
+        self.memory_items = memory_items
+        self.disk_size_limit = disk_size_limit
+
+        self.lock = Lock()
+        self.memory: OrderedDict[str, np.ndarray] = OrderedDict()
+        self.disk: OrderedDict[str, int] = OrderedDict()
+        self.disk_size = 0
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._load_disk_index()
+        metrics.add_collector(self._collect_metrics)
+
+    @staticmethod
+    def make_key(text: str, speaker: str, language: str, speed: float, model_type: str = '') -> str:
+        return md5_hash(json.dumps([text, speaker, language, speed, model_type], ensure_ascii=False))
+
+    def get(self, key: str) -> np.ndarray | None:
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                self.memory_hits += 1
+                return self.memory[key]
+            if key not in self.disk:
+                self.misses += 1
+                return None
+            self.disk.move_to_end(key)
+
+        file_path = self._make_file_path(key)
+        try:
+            pcm = np.load(file_path)
+            os.utime(file_path)
+        except OSError:
+            with self.lock:
+                self._forget_disk_entry(key)
+                self.misses += 1
+            return None
+
+        with self.lock:
+            self.disk_hits += 1
+            self._put_into_memory(key, pcm)
+        return pcm
+
+    def put(self, key: str, pcm: np.ndarray):
+        pcm = np.asarray(pcm, dtype=np.float32)
+        with self.lock:
+            self._put_into_memory(key, pcm)
+        if self.disk_size_limit <= 0:
+            return
+
+        file_path = self._make_file_path(key)
+        temporary_file_path = f'{file_path}.tmp'
+        with open(temporary_file_path, 'wb') as file:
+            np.save(file, pcm)
+        os.replace(temporary_file_path, file_path)
+        file_size = os.path.getsize(file_path)
+
+        with self.lock:
+            self._forget_disk_entry(key)
+            self.disk[key] = file_size
+            self.disk_size += file_size
+            self._evict_disk_entries()
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            requests = self.memory_hits + self.disk_hits + self.misses
+            return {
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': (self.memory_hits + self.disk_hits) / requests if requests else 0.0,
+                'memory_items': len(self.memory),
+                'disk_items': len(self.disk),
+                'disk_size': self.disk_size,
+            }
+
+    def _collect_metrics(self):
+        stats = self.get_stats()
+        help = 'Cache lookups by result'
+        yield 'cache_requests_total', 'counter', help, {'cache': 'tts', 'result': 'memory_hit'}, stats['memory_hits']
+        yield 'cache_requests_total', 'counter', help, {'cache': 'tts', 'result': 'disk_hit'}, stats['disk_hits']
+        yield 'cache_requests_total', 'counter', help, {'cache': 'tts', 'result': 'miss'}, stats['misses']
+        yield 'tts_cache_disk_bytes', 'gauge', 'Disk used by cached sentences', {}, stats['disk_size']
+
+    def _put_into_memory(self, key: str, pcm: np.ndarray):
+        self.memory[key] = pcm
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_items:
+            self.memory.popitem(last=False)
+
+    def _evict_disk_entries(self):
+        while self.disk_size > self.disk_size_limit and self.disk:
+            key, _ = next(iter(self.disk.items()))
+            self._forget_disk_entry(key)
+            try:
+                os.remove(self._make_file_path(key))
+            except OSError as e:
+                print(f'Cannot delete cached sentence {key}: {e}')
+
+    def _forget_disk_entry(self, key: str):
+        size = self.disk.pop(key, None)
+        if size is not None:
+            self.disk_size -= size
+
+    def _load_disk_index(self):
+        os.makedirs(self.cache_path, exist_ok=True)
+        entries = []
+        for entry in os.scandir(self.cache_path):
+            if entry.is_file() and entry.name.endswith(self._FILE_EXTENSION):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name[: -len(self._FILE_EXTENSION)], stat.st_size))
+        for _, key, size in sorted(entries):
+            self.disk[key] = size
+            self.disk_size += size
+        self._evict_disk_entries()
+
+    def _make_file_path(self, key: str) -> str:
+        return os.path.join(self.cache_path, f'{key}{self._FILE_EXTENSION}')
@@ -1,8 +1,14 @@
 from abc import ABC, abstractmethod
+from threading import Lock
+from typing import Iterator
+import os
+import time
 
-import torch
+import numpy as np
 
 from config import TTS_XTTS_MODEL, TTS_XTTS_SPEAKER, TTS_XTTS_LANGUAGE
+from src.text2speech.cache import SynthesisCache
+from src.tracing.services import tracer
 
 
 class BaseService(ABC):
@@ -16,13 +22,30 @@ class BaseService(ABC):
         """
         pass
 
+    @abstractmethod
+    def synthesize(self, text: str):
+        """
+        Abstract method to process text to mono float32 PCM (NumPy array) at sample_rate
+        """
+        pass
+
+    def stream(self, text: str) -> Iterator[np.ndarray]:
+        """
+        Yields mono float32 PCM chunks as they are produced. Services without streaming support yield
+        the whole sentence at once.
+        """
+        yield self.synthesize(text)
+
 
 class XTTSService(BaseService):
     _BASE_MODEL_TYPE = TTS_XTTS_MODEL
     _BASE_MODEL_SPEAKER = TTS_XTTS_SPEAKER
     _BASE_MODEL_LANGUAGE = TTS_XTTS_LANGUAGE
+    _BASE_MODEL_SPEED = 2
+    _STREAM_CHUNK_SIZE = 20
 
-    def __init__(self, model_type: str = _BASE_MODEL_TYPE) -> None:
+    def __init__(self, model_type: str = _BASE_MODEL_TYPE, cache: SynthesisCache | None = None) -> None:
+        import torch
         from TTS.api import TTS
 
         device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
@@ -30,6 +53,11 @@ class XTTSService(BaseService):
 
         model = TTS(model_type).to(device)
 
+        self.model_type = model_type
+        self.device = device
+        self.cache = cache if cache is not None else SynthesisCache()
+        self.conditioning: dict[tuple[str, str], tuple] = {}
+        self.conditioning_lock = Lock()
         super().__init__(model)
 
     def processing(
@@ -39,4 +67,123 @@ class XTTSService(BaseService):
         language: str = _BASE_MODEL_LANGUAGE,
         speaker: str = _BASE_MODEL_SPEAKER,
     ):
-        self.t2s.tts_to_file(text=text, file_path=path_to_output_wav, language=language, speaker=speaker, speed=2)
+        wav = self.synthesize(text, language=language, speaker=speaker)
+        self.t2s.synthesizer.save_wav(wav=wav, path=path_to_output_wav)
+
+    @property
+    def sample_rate(self) -> int:
+        return self.t2s.synthesizer.output_sample_rate
+
+    def synthesize(
+        self,
+        text: str,
+        language: str = _BASE_MODEL_LANGUAGE,
+        speaker: str = _BASE_MODEL_SPEAKER,
+    ) -> np.ndarray:
+        with tracer.span('tts', characters=len(text)) as span:
+            cache_key = self.cache.make_key(text, speaker, language, self._BASE_MODEL_SPEED, self.model_type)
+            wav = self.cache.get(cache_key)
+            span['cache'] = 'hit' if wav is not None else 'miss'
+            if wav is not None:
+                return wav
+
+            wav = self.generate(text, language, speaker)
+            self.cache.put(cache_key, wav)
+            return wav
+
+    def generate(self, text: str, language: str, speaker: str) -> np.ndarray:
+        """
+        Synthesizes a sentence with the cached speaker conditioning
+        """
+        import torch
+
+        tts_model = self.t2s.synthesizer.tts_model
+        gpt_cond_latent, speaker_embedding = self.get_conditioning_latents(speaker, language)
+        with torch.inference_mode():
+            result = tts_model.inference(
+                text,
+                language,
+                gpt_cond_latent,
+                speaker_embedding,
+                speed=self._BASE_MODEL_SPEED,
+                enable_text_splitting=True,
+                **self.get_sampling_settings(),
+            )
+        return np.asarray(result['wav'], dtype=np.float32)
+
+    def warm_up(self):
+        self.generate('Hello.', self._BASE_MODEL_LANGUAGE, self._BASE_MODEL_SPEAKER)
+
+    def stream(
+        self,
+        text: str,
+        language: str = _BASE_MODEL_LANGUAGE,
+        speaker: str = _BASE_MODEL_SPEAKER,
+        stream_chunk_size: int = _STREAM_CHUNK_SIZE,
+    ) -> Iterator[np.ndarray]:
+        cache_key = self.cache.make_key(text, speaker, language, self._BASE_MODEL_SPEED, self.model_type)
+        wav = self.cache.get(cache_key)
+        if wav is not None:
+            tracer.record_span('tts_first_chunk', 0.0, characters=len(text), cache='hit')
+            yield wav
+            return
+
+        started_at = time.perf_counter()
+        tts_model = self.t2s.synthesizer.tts_model
+        gpt_cond_latent, speaker_embedding = self.get_conditioning_latents(speaker, language)
+        chunks = []
+        for chunk in tts_model.inference_stream(
+            text,
+            language,
+            gpt_cond_latent,
+            speaker_embedding,
+            stream_chunk_size=stream_chunk_size,
+            speed=self._BASE_MODEL_SPEED,
+            **self.get_sampling_settings(),
+        ):
+            chunk = chunk.cpu().numpy().astype(np.float32)
+            if not chunks:
+                first_chunk_latency = time.perf_counter() - started_at
+                tracer.record_span('tts_first_chunk', first_chunk_latency, characters=len(text), cache='miss')
+            chunks.append(chunk)
+            yield chunk
+
+        if chunks:
+            self.cache.put(cache_key, np.concatenate(chunks))
+
+    def get_sampling_settings(self) -> dict:
+        """
+        Sampling settings of the model config, the ones TTS.tts passed to XTTS before inference was called directly
+        """
+        config = self.t2s.synthesizer.tts_model.config
+        return {
+            'temperature': config.temperature,
+            'length_penalty': config.length_penalty,
+            'repetition_penalty': config.repetition_penalty,
+            'top_k': config.top_k,
+            'top_p': config.top_p,
+        }
+
+    def get_conditioning_latents(self, speaker: str, language: str = _BASE_MODEL_LANGUAGE):
+        """
+        Returns GPT conditioning latents and speaker embedding on the model device, computed once per
+        (speaker, language). A speaker is a built-in XTTS speaker name or a path to a reference wav.
+        """
+        with self.conditioning_lock:
+            if (speaker, language) in self.conditioning:
+                return self.conditioning[(speaker, language)]
+
+            tts_model = self.t2s.synthesizer.tts_model
+            if speaker in tts_model.speaker_manager.speakers:
+                speaker_latents = tts_model.speaker_manager.speakers[speaker]
+                gpt_cond_latent = speaker_latents['gpt_cond_latent']
+                speaker_embedding = speaker_latents['speaker_embedding']
+            elif os.path.isfile(speaker):
+                with tracer.span('tts_conditioning', speaker=speaker):
+                    gpt_cond_latent, speaker_embedding = tts_model.get_conditioning_latents(audio_path=[speaker])
+            else:
+                raise ValueError(f'Unknown XTTS speaker {speaker}')
+
+            conditioning = (gpt_cond_latent.to(self.device), speaker_embedding.to(self.device))
+            self.conditioning[(speaker, language)] = conditioning
+            return conditioning
@@ -0,0 +1,216 @@
+import contextvars
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Iterable
+
+from config import TRACE_LOG_SPANS
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+_current_request: contextvars.ContextVar[dict | None] = contextvars.ContextVar('trace_request', default=None)
+
+
+class MetricsRegistry:
+    """
+    Counters, gauges and histograms rendered in the Prometheus text format. Collectors are called on
+    every scrape and return (name, type, help, labels, value) samples of state owned by other services.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.metrics: OrderedDict[str, dict] = OrderedDict()
+        self.collectors: list[Callable[[], Iterable[tuple]]] = []
+
+    def inc(self, name: str, value: float = 1.0, help: str = '', **labels):
+        with self.lock:
+            samples = self._get_samples(name, 'counter', help)
+            key = self._make_key(labels)
+            samples[key] = samples.get(key, 0.0) + value
+
+    def set(self, name: str, value: float, help: str = '', **labels):
+        with self.lock:
+            self._get_samples(name, 'gauge', help)[self._make_key(labels)] = value
+
+    def observe(self, name: str, value: float, help: str = '', buckets=DURATION_BUCKETS, **labels):
+        with self.lock:
+            metric = self.metrics.setdefault(
+                name, {'type': 'histogram', 'help': help, 'buckets': buckets, 'samples': {}}
+            )
+            histogram = metric['samples'].setdefault(
+                self._make_key(labels), {'buckets': [0] * len(metric['buckets']), 'sum': 0.0, 'count': 0}
+            )
+            for index, bound in enumerate(metric['buckets']):
+                if value <= bound:
+                    histogram['buckets'][index] += 1
+                    break
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    def add_collector(self, collector: Callable[[], Iterable[tuple]]):
+        with self.lock:
+            self.collectors.append(collector)
+
+    def render(self) -> str:
+        with self.lock:
+            collectors = list(self.collectors)
+
+        collected: OrderedDict[str, dict] = OrderedDict()
+        for collector in collectors:
+            try:
+                samples = list(collector())
+            except Exception as error:
+                print(f'Metrics collector failed: {error}')
+                continue
+            for name, type, help, labels, value in samples:
+                metric = collected.setdefault(name, {'type': type, 'help': help, 'samples': {}})
+                metric['samples'][self._make_key(labels)] = value
+
+        lines = []
+        with self.lock:
+            # A name both recorded here and collected (e.g. cache_requests_total of the STT and TTS caches)
+            # is rendered as one family, a repeated HELP/TYPE block makes scrapers reject the whole page
+            for name, metric in self.metrics.items():
+                if name in collected:
+                    metric = {**metric, 'samples': {**metric['samples'], **collected.pop(name)['samples']}}
+                lines.extend(self._render_metric(name, metric))
+        for name, metric in collected.items():
+            lines.extend(self._render_metric(name, metric))
+        return '\n'.join(lines) + '\n'
+
+    def _get_samples(self, name: str, type: str, help: str) -> dict:
+        metric = self.metrics.setdefault(name, {'type': type, 'help': help, 'samples': {}})
+        return metric['samples']
+
+    @staticmethod
+    def _make_key(labels: dict) -> tuple:
+        return tuple(sorted((label, str(value)) for label, value in labels.items()))
+
+    @classmethod
+    def _render_metric(cls, name: str, metric: dict) -> list[str]:
+        lines = [f'# HELP {name} {metric["help"] or name}', f'# TYPE {name} {metric["type"]}']
+        for key, value in metric['samples'].items():
+            if metric['type'] != 'histogram':
+                lines.append(f'{name}{cls._format_labels(key)} {value}')
+                continue
+            for bound, count in zip(metric['buckets'], cls._accumulate(value['buckets'])):
+                lines.append(f'{name}_bucket{cls._format_labels(key + (("le", str(bound)),))} {count}')
+            lines.append(f'{name}_bucket{cls._format_labels(key + (("le", "+Inf"),))} {value["count"]}')
+            lines.append(f'{name}_sum{cls._format_labels(key)} {value["sum"]}')
+            lines.append(f'{name}_count{cls._format_labels(key)} {value["count"]}')
+        return lines
+
+    @staticmethod
+    def _accumulate(counts: list[int]) -> list[int]:
+        accumulated, total = [], 0
+        for count in counts:
+            total += count
+            accumulated.append(total)
+        return accumulated
+
+    @staticmethod
+    def _format_labels(key: tuple) -> str:
+        if not key:
+            return ''
+        labels = ','.join(f'{label}="{value}"' for label, value in key)
+        return '{' + labels + '}'
+
+
+class Tracer:
+    """
+    Per-request spans. A request (a Telegram voice message, a websocket voice window) gets an id kept in
+    a context variable, so every span opened by the tasks and stage threads serving it carries the request
+    and session ids. Span durations are also exported as the stage_duration_seconds histogram.
+    """
+
+    _MAX_SPANS = 1000
+
+    def __init__(self, metrics: MetricsRegistry, max_spans: int = _MAX_SPANS, log_spans: bool = TRACE_LOG_SPANS):
+        self.metrics = metrics
+        self.log_spans = log_spans
+        self.lock = threading.Lock()
+        self.spans: deque[dict] = deque(maxlen=max_spans)
+
+    def start_request(self, session_id: str | None = None) -> str:
+        request_id = uuid.uuid4().hex
+        _current_request.set({'request_id': request_id, 'session_id': session_id})
+        return request_id
+
+    @staticmethod
+    def get_request() -> dict:
+        return _current_request.get() or {'request_id': None, 'session_id': None}
+
+    @contextmanager
+    def span(self, stage: str, **attributes):
+        """
+        Measures the enclosed block. The yielded dict takes extra attributes, such as a cache result.
+        """
+        span = dict(attributes)
+        started_at = time.perf_counter()
+        try:
+            yield span
+        except BaseException as error:
+            span['error'] = type(error).__name__
+            raise
+        finally:
+            self.record_span(stage, time.perf_counter() - started_at, **span)
+
+    def record_span(self, stage: str, duration: float, **attributes):
+        span = {'stage': stage, **self.get_request(), 'duration': duration, 'timestamp': time.time(), **attributes}
+        with self.lock:
+            self.spans.append(span)
+        self.metrics.observe('stage_duration_seconds', duration, 'Duration of pipeline stages', stage=stage)
+        if 'error' in span:
+            self.metrics.inc('stage_errors_total', help='Failed pipeline stages', stage=stage)
+        if self.log_spans:
+            print(json.dumps(span, ensure_ascii=False, default=str))
+
+    def get_spans(self, request_id: str | None = None) -> list[dict]:
+        with self.lock:
+            spans = list(self.spans)
+        if request_id is None:
+            return spans
+        return [span for span in spans if span['request_id'] == request_id]
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == '/metrics':
+            body = metrics.render().encode('utf-8')
+            content_type = 'text/plain; version=0.0.4; charset=utf-8'
+        elif self.path == '/traces':
+            body = json.dumps(tracer.get_spans(), ensure_ascii=False, default=str).encode('utf-8')
+            content_type = 'application/json'
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(host: str, port: int) -> ThreadingHTTPServer | None:
+    """
+    Serves /metrics (Prometheus text) and /traces (recent spans as JSON) from a daemon thread.
+    Port 0 disables the endpoint.
+    """
+    if not port:
+        return None
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='metrics_server', daemon=True).start()
+    print(f'Serving metrics on http://{host}:{port}/metrics')
+    return server
+
+
+metrics = MetricsRegistry()
+tracer = Tracer(metrics)
@@ -0,0 +1,85 @@
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+from config import AUDIO_CAPTURE_SILENCE_DURATION, AUDIO_CAPTURE_SILENCE_THRESHOLD
+from src.audio_formatter.services import PCM_SAMPLE_RATE
+
+
+class BaseService(ABC):
+    def __init__(self, sample_rate: int, silence_duration: float):
+        self.sample_rate = sample_rate
+        self.silence_duration = silence_duration
+
+    @abstractmethod
+    def get_voiced_frames(self, pcm: np.ndarray) -> np.ndarray:
+        """
+        Abstract method to classify fixed-size frames of mono float32 PCM as voiced (True) or silent (False)
+        """
+        pass
+
+    @property
+    @abstractmethod
+    def frame_duration(self) -> float:
+        pass
+
+    def is_speech(self, pcm: np.ndarray, min_speech_duration: float) -> bool:
+        voiced_frames = self.get_voiced_frames(pcm)
+        return np.count_nonzero(voiced_frames) * self.frame_duration >= min_speech_duration
+
+    def get_trailing_silence(self, pcm: np.ndarray) -> float:
+        voiced_frames = self.get_voiced_frames(pcm)
+        voiced_indexes = np.flatnonzero(voiced_frames)
+        if not len(voiced_indexes):
+            return len(pcm) / self.sample_rate
+        return (len(voiced_frames) - 1 - voiced_indexes[-1]) * self.frame_duration
+
+    def is_silence_long_enough(self, silence: float) -> bool:
+        return silence >= self.silence_duration
+
+
+class EnergyVADService(BaseService):
+    """
+    Frame energy VAD with an optional zero-crossing rate gate, vectorized over all frames of a window.
+    Cheap enough to run on every window, so silent audio never reaches the STT model.
+    """
+
+    _FRAME_DURATION = 0.03
+    _MIN_SPEECH_DURATION = 0.2
+
+    def __init__(
+        self,
+        energy_threshold: float = AUDIO_CAPTURE_SILENCE_THRESHOLD,
+        silence_duration: float = AUDIO_CAPTURE_SILENCE_DURATION,
+        sample_rate: int = PCM_SAMPLE_RATE,
+        frame_duration: float = _FRAME_DURATION,
+        max_zero_crossing_rate: float | None = None,
+    ) -> None:
+        super().__init__(sample_rate, silence_duration)
+        self.energy_threshold = energy_threshold
+        self.frame_length = max(int(sample_rate * frame_duration), 2)
+        self.max_zero_crossing_rate = max_zero_crossing_rate
+
+    @property
+    def frame_duration(self) -> float:
+        return self.frame_length / self.sample_rate
+
+    def is_speech(self, pcm: np.ndarray, min_speech_duration: float = _MIN_SPEECH_DURATION) -> bool:
+        return super().is_speech(pcm, min_speech_duration)
+
+    def get_voiced_frames(self, pcm: np.ndarray) -> np.ndarray:
+        frames_count = len(pcm) // self.frame_length
+        if not frames_count:
+            return np.zeros(0, dtype=bool)
+        frames = np.asarray(pcm[: frames_count * self.frame_length], dtype=np.float32)
+        frames = frames.reshape(frames_count, self.frame_length)
+
+        rms = np.sqrt(np.mean(np.square(frames, dtype=np.float64), axis=1))
+        voiced_frames = rms >= self.energy_threshold
+
+        if self.max_zero_crossing_rate is not None:
+            signs = np.signbit(frames)
+            zero_crossings = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1)
+            voiced_frames &= zero_crossings / (self.frame_length - 1) <= self.max_zero_crossing_rate
+
+        return voiced_frames
@@ -0,0 +1,102 @@
+import base64
+import json
+import struct
+
+import numpy as np
+
+JSON_FRAMING = 'json'
+BINARY_FRAMING = 'binary'
+
+FRAME_TYPES = {'stream': 1, 'greetings': 2}
+CODECS = {'wav': 1, 'pcm16': 2, 'ogg': 3}
+LAST_CHUNK_FLAG = 1
+
+_PROTOCOL_VERSION = 1
+# version, frame type, codec, flags, sequence, chunk index, sample rate
+_HEADER = struct.Struct('!BBBBIHI')
+
+
+class InvalidFrame(Exception):
+    def __init__(self, reason: str) -> None:
+        super().__init__(f'Invalid websocket frame: {reason}')
+
+
+def make_json_frame(wav_data: bytes, type: str = 'stream') -> str:
+    audio_base64 = base64.b64encode(wav_data).decode('utf-8')
+    return json.dumps({'type': type, 'data': audio_base64})
+
+
+def make_cancel_frame() -> str:
+    return json.dumps({'type': 'cancel'})
+
+
+def make_busy_frame() -> str:
+    return json.dumps({'type': 'busy'})
+
+
+def pcm_to_pcm16(pcm: np.ndarray) -> bytes:
+    return (np.clip(pcm, -1.0, 1.0) * 32767).astype('<i2').tobytes()
+
+
+class BinaryFrameEncoder:
+    """
+    Binary framing: a 14 byte header (version, type, codec, flags, sequence, chunk index, sample rate)
+    followed by raw PCM16 or Opus audio. Audio is split into fixed-size chunks, so the client can start
+    playback of PCM before the whole sentence arrives.
+    """
+
+    _CHUNK_SIZE = 16 * 1024
+
+    def __init__(self, chunk_size: int = _CHUNK_SIZE) -> None:
+        self.chunk_size = chunk_size
+
+    def split(self, payload: bytes) -> list[bytes]:
+        chunks = [payload[start : start + self.chunk_size] for start in range(0, len(payload), self.chunk_size)]
+        return chunks or [b'']
+
+    def make_frames(self, chunks: list[bytes], type: str, codec: str, sequence: int, sample_rate: int = 0):
+        last_index = len(chunks) - 1
+        return [
+            self.make_frame(chunk, type, codec, sequence, index, index == last_index, sample_rate)
+            for index, chunk in enumerate(chunks)
+        ]
+
+    @staticmethod
+    def make_frame(
+        chunk: bytes, type: str, codec: str, sequence: int, index: int, is_last: bool, sample_rate: int = 0
+    ) -> bytes:
+        flags = LAST_CHUNK_FLAG if is_last else 0
+        header = _HEADER.pack(_PROTOCOL_VERSION, FRAME_TYPES[type], CODECS[codec], flags, sequence, index, sample_rate)
+        return header + chunk
+
+    def encode(self, payload: bytes, type: str, codec: str, sequence: int, sample_rate: int = 0) -> list[bytes]:
+        return self.make_frames(self.split(payload), type, codec, sequence, sample_rate)
+
+
+def decode_frame(frame: bytes) -> tuple[dict, bytes]:
+    if len(frame) < _HEADER.size:
+        raise InvalidFrame('frame is shorter than header')
+    version, type, codec, flags, sequence, index, sample_rate = _HEADER.unpack_from(frame)
+    if version != _PROTOCOL_VERSION:
+        raise InvalidFrame(f'unsupported version {version}')
+    header = {
+        'type': type,
+        'codec': codec,
+        'is_last': bool(flags & LAST_CHUNK_FLAG),
+        'sequence': sequence,
+        'index': index,
+        'sample_rate': sample_rate,
+    }
+    return header, frame[_HEADER.size :]
+
+
+def parse_control_message(message: str) -> dict | None:
+    """
+    Returns a control message ({"type": "hello", "framing": "binary", "codec": "pcm16"}) or None
+    for plain text notifications such as "greetings"
+    """
+    try:
+        control = json.loads(message)
+    except ValueError:
+        return None
+    return control if isinstance(control, dict) else None
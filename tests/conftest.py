@@ -0,0 +1,14 @@
+import os
+
+# config reads these at import time, tests do not need a .env file
+for env_var_name, value in {
+    'LLM_MODEL': 'stub',
+    'STT_WHISPER_MODEL': 'base',
+    'TTS_XTTS_MODEL': 'tts_models/multilingual/multi-dataset/xtts_v2',
+    'TTS_XTTS_SPEAKER': 'Adde Michal',
+    'TTS_XTTS_LANGUAGE': 'ru',
+    'FS_ROOT_PATH': 'artifacts',
+    'AUDIO_CAPTURE_SILENCE_THRESHOLD': '0.01',
+    'AUDIO_CAPTURE_SILENCE_DURATION': '1.0',
+}.items():
+    os.environ.setdefault(env_var_name, value)
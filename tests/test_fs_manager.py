@@ -0,0 +1,45 @@
+import asyncio
+import os
+import time
+
+from src.fs_manager.services import BaseArtifactsIO
+
+
+class ArtifactsIO(BaseArtifactsIO):
+    async def _write_audio_file(self, scope, voice_message):
+        artifact = scope.create(voice_message['filename'])
+        await artifact.write(voice_message['data'])
+        return artifact
+
+
+def test_sweep_prunes_only_stale_directories(tmp_path):
+    store = ArtifactsIO(root_path=str(tmp_path), max_age=60)
+    stale_directory = tmp_path / 'crashed' / 'request'
+    stale_directory.mkdir(parents=True)
+    (stale_directory / 'input.ogg').write_bytes(b'audio')
+    old = time.time() - 120
+    for stale_path in (stale_directory / 'input.ogg', stale_directory, stale_directory.parent):
+        os.utime(stale_path, (old, old))
+    # Created by a scope opened after the sweep read the live scopes
+    new_directory = tmp_path / 'user' / 'request'
+    new_directory.mkdir(parents=True)
+
+    removed = asyncio.run(store.sweep())
+
+    assert removed == 1
+    assert not stale_directory.parent.exists()
+    assert new_directory.exists()
+
+
+def test_sweep_keeps_files_of_live_scopes(tmp_path):
+    store = ArtifactsIO(root_path=str(tmp_path), memory_limit=0, max_age=0)
+
+    async def scenario():
+        async with store.scope('user') as scope:
+            artifact = await store.write_user_audio_file(scope, {'filename': 'input.ogg', 'data': b'audio'})
+            assert artifact.is_spilled
+            assert await store.sweep() == 0
+            assert await artifact.read() == b'audio'
+        assert not os.listdir(tmp_path / 'user')
+
+    asyncio.run(scenario())
@@ -0,0 +1,189 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pytest
+
+pytest.importorskip('langchain_ollama')
+
+from src.generative_ai.services import LangChainService  # noqa: E402
+from src.pipeline.services import StageExecutor, VoiceReplyPipeline  # noqa: E402
+
+SENTENCE = 'Это одно предложение ответа. '
+CHUNK_DELAY = 0.05
+
+
+class StubOllama:
+    """
+    Streams /api/chat answers sentence by sentence like Ollama does, until max_chunks or the client goes away
+    """
+
+    def __init__(self, max_chunks: int) -> None:
+        self.max_chunks = max_chunks
+        self.disconnected = threading.Event()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers['Content-Length']))
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/x-ndjson')
+                self.end_headers()
+                try:
+                    for _ in range(stub.max_chunks):
+                        self.write_chunk({'message': {'role': 'assistant', 'content': SENTENCE}, 'done': False})
+                        time.sleep(CHUNK_DELAY)
+                    self.write_chunk({
+                        'message': {'role': 'assistant', 'content': ''},
+                        'done': True,
+                        'done_reason': 'stop',
+                        'prompt_eval_count': 10,
+                        'prompt_eval_duration': 1000000,
+                        'eval_count': stub.max_chunks,
+                        'eval_duration': 1000000,
+                    })
+                except (BrokenPipeError, ConnectionResetError):
+                    stub.disconnected.set()
+
+            def write_chunk(self, chunk: dict):
+                chunk = {'model': 'stub', 'created_at': '2024-01-01T00:00:00Z', **chunk}
+                self.wfile.write(json.dumps(chunk).encode() + b'\n')
+                self.wfile.flush()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def host(self) -> str:
+        return f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def make_service(monkeypatch, host: str) -> LangChainService:
+    monkeypatch.setenv('OLLAMA_HOST', host)
+    return LangChainService(model_type='stub')
+
+
+def make_pipeline():
+    stages = {name: StageExecutor(name) for name in ('tts', 'encoder')}
+    pipeline = VoiceReplyPipeline(tts_stage=stages['tts'], encoder_stage=stages['encoder'])
+    return pipeline, stages
+
+
+def synthesize(text: str) -> np.ndarray:
+    time.sleep(CHUNK_DELAY)
+    return np.zeros(len(text), dtype=np.float32)
+
+
+def test_cancelled_answer_frees_workers_and_is_not_remembered(monkeypatch):
+    async def scenario():
+        with StubOllama(max_chunks=200) as stub:
+            service = make_service(monkeypatch, stub.host)
+            pipeline, stages = make_pipeline()
+            first_delivery = asyncio.Event()
+
+            async def send(_):
+                first_delivery.set()
+
+            run = asyncio.create_task(
+                pipeline.run(service.aask_model('Вопрос?', session_id='barge-in'), synthesize, len, send)
+            )
+            await asyncio.wait_for(first_delivery.wait(), timeout=5)
+            run.cancel()
+            await asyncio.gather(run, return_exceptions=True)
+
+            # The Ollama stream is closed, so the server stops generating
+            assert await asyncio.to_thread(stub.disconnected.wait, 5)
+            # Every stage worker is free again right away
+            for stage in stages.values():
+                assert await asyncio.wait_for(stage.run(lambda: 'free'), timeout=1) == 'free'
+            # The half answer the user never heard is not part of the next prompt
+            assert not service.get_memory('barge-in').turns
+            assert service.get_turn_metrics()[-1]['interrupted']
+
+    asyncio.run(scenario())
+
+
+def test_finished_answer_is_remembered(monkeypatch):
+    async def scenario():
+        with StubOllama(max_chunks=3) as stub:
+            service = make_service(monkeypatch, stub.host)
+            pipeline, _ = make_pipeline()
+            delivered = []
+
+            async def send(item):
+                delivered.append(item)
+
+            sentences = service.aask_model('Вопрос?', session_id='complete')
+            stats = await pipeline.run(sentences, synthesize, len, send)
+
+        assert stats['sentences'] == len(delivered) > 0
+        question, answer = service.get_memory('complete').turns[-1]
+        assert question == 'Вопрос?'
+        assert answer == SENTENCE * 3
+        assert not service.get_turn_metrics()[-1]['interrupted']
+
+    asyncio.run(scenario())
+
+
+def test_answer_interrupted_while_delivered_is_not_remembered(monkeypatch):
+    async def scenario():
+        with StubOllama(max_chunks=4) as stub:
+            service = make_service(monkeypatch, stub.host)
+            # One queue slot per stage, so the answer is generated in full while the first segment is being sent
+            pipeline = VoiceReplyPipeline(StageExecutor('tts'), StageExecutor('encoder'), queue_size=1)
+            delivered = []
+
+            async def send(item):
+                delivered.append(item)
+                await asyncio.sleep(10)
+
+            async def answer():
+                sentences = service.aask_model('Вопрос?', session_id='barge-in', remember=False)
+                await pipeline.run(sentences, synthesize, len, send)
+                service.confirm_turn('barge-in')
+
+            run = asyncio.create_task(answer())
+            while not service.get_turn_metrics():
+                await asyncio.sleep(CHUNK_DELAY)
+            run.cancel()
+            await asyncio.gather(run, return_exceptions=True)
+
+        # The LLM finished its answer, but the user heard only the first of its segments
+        assert not service.get_turn_metrics()[-1]['interrupted']
+        assert len(delivered) == 1
+        assert not service.get_memory('barge-in').turns
+
+    asyncio.run(scenario())
+
+
+def test_delivered_answer_is_remembered_once_confirmed(monkeypatch):
+    async def scenario():
+        with StubOllama(max_chunks=4) as stub:
+            service = make_service(monkeypatch, stub.host)
+            pipeline, _ = make_pipeline()
+
+            async def send(_):
+                pass
+
+            sentences = service.aask_model('Вопрос?', session_id='delivered', remember=False)
+            await pipeline.run(sentences, synthesize, len, send)
+            assert not service.get_memory('delivered').turns
+            service.confirm_turn('delivered')
+
+        assert service.get_memory('delivered').turns[-1] == ('Вопрос?', SENTENCE * 4)
+
+    asyncio.run(scenario())
@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+
+from src.inference.services import InferenceQueueFull
+from src.pipeline.services import StageExecutor, VoiceReplyPipeline
+
+SENTENCES = ['Первое предложение.', 'Второе предложение.']
+
+
+class FullQueueStage:
+    """
+    TTS stage whose inference queue is always full
+    """
+
+    async def run(self, func, *args, **kwargs):
+        raise InferenceQueueFull('tts')
+
+
+async def make_sentences():
+    for sentence in SENTENCES:
+        yield sentence
+
+
+def stream_chunks(text: str):
+    for word in text.split():
+        yield word
+
+
+async def run_pipeline(tts_stage, synthesize, delivered: list):
+    async def send(item):
+        delivered.append(item)
+
+    pipeline = VoiceReplyPipeline(tts_stage=tts_stage, encoder_stage=StageExecutor('encoder_test'))
+    return await asyncio.wait_for(
+        pipeline.run(make_sentences(), synthesize, lambda chunk: chunk, send, stream_synthesis=True), timeout=2
+    )
+
+
+def test_streamed_chunks_are_delivered_in_order():
+    delivered = []
+    stats = asyncio.run(run_pipeline(StageExecutor('tts_test'), stream_chunks, delivered))
+    assert delivered == [word for sentence in SENTENCES for word in sentence.split()]
+    assert stats['sentences'] == len(SENTENCES)
+
+
+def test_full_tts_queue_fails_the_streaming_pipeline():
+    delivered = []
+    with pytest.raises(InferenceQueueFull):
+        asyncio.run(run_pipeline(FullQueueStage(), stream_chunks, delivered))
+    assert not delivered
+
+
+def test_failing_synthesis_fails_the_streaming_pipeline():
+    def failing_chunks(text: str):
+        yield text
+        raise RuntimeError('synthesis failed')
+
+    delivered = []
+    with pytest.raises(RuntimeError, match='synthesis failed'):
+        asyncio.run(run_pipeline(StageExecutor('tts_test'), failing_chunks, delivered))
+    assert delivered == [SENTENCES[0]]
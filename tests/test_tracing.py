@@ -0,0 +1,16 @@
+from src.tracing.services import MetricsRegistry
+
+
+def test_recorded_and_collected_samples_of_one_name_render_as_one_family():
+    metrics = MetricsRegistry()
+    metrics.inc('cache_requests_total', help='Cache lookups by result', cache='stt', result='hit')
+    metrics.add_collector(
+        lambda: [('cache_requests_total', 'counter', 'Cache lookups by result', {'cache': 'tts', 'result': 'miss'}, 2)]
+    )
+
+    lines = metrics.render().splitlines()
+
+    assert lines.count('# TYPE cache_requests_total counter') == 1
+    assert lines.count('# HELP cache_requests_total Cache lookups by result') == 1
+    assert 'cache_requests_total{cache="stt",result="hit"} 1.0' in lines
+    assert 'cache_requests_total{cache="tts",result="miss"} 2' in lines